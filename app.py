@@ -1,9 +1,14 @@
 import dash_bootstrap_components as dbc
-from dash import Dash, Input, Output, State, dcc, html
+from dash import ClientsideFunction, Dash, Input, Output, State, dcc, html
 
+from src.api import register_api_routes
+from src.db.connection import init_db
+from src.export import register_export_routes
+from src.metrics import register_metrics
 from src.pages.graph import graph_page_layout
 from src.pages.landing import landing_page_layout
 from src.pages.table import table_page_layout
+from src.server import register_health_routes
 
 # Initialize the Dash app with Bootstrap theme and suppress callback exceptions
 app = Dash(
@@ -16,6 +21,11 @@ app = Dash(
     suppress_callback_exceptions=True,
 )
 app.title = "Superstore Dashboard"
+init_db()
+register_health_routes(app.server)
+register_export_routes(app.server)
+register_api_routes(app.server)
+register_metrics(app)
 
 
 # Define the callback for navigating between pages
@@ -24,7 +34,7 @@ def display_page(pathname):
     if pathname == "/table":
         return table_page_layout
     elif pathname == "/graph":
-        return graph_page_layout
+        return graph_page_layout()
     elif pathname == "/landing":
         return landing_page_layout
     else:
@@ -155,24 +165,20 @@ app.layout = html.Div(
 )
 
 
-# Redirect callback
-@app.callback(Output("redirect", "pathname"), [Input("url", "pathname")])
-def redirect_to_landing(pathname):
-    if pathname in ["/", ""]:
-        return "/landing"
-    return pathname
-
+# Redirect callback, runs in the browser, see assets/javascipt/callbacks.js
+app.clientside_callback(
+    ClientsideFunction(namespace="layout", function_name="redirect_to_landing"),
+    Output("redirect", "pathname"),
+    Input("url", "pathname"),
+)
 
-# add callback for toggling the collapse on small screens
-@app.callback(
+# Toggle the collapse on small screens, in the browser
+app.clientside_callback(
+    ClientsideFunction(namespace="layout", function_name="toggle_navbar_collapse"),
     Output("navbar-collapse", "is_open"),
-    [Input("navbar-toggler", "n_clicks")],
-    [State("navbar-collapse", "is_open")],
+    Input("navbar-toggler", "n_clicks"),
+    State("navbar-collapse", "is_open"),
 )
-def toggle_navbar_collapse(n, is_open):
-    if n:
-        return not is_open
-    return is_open
 
 
 if __name__ == "__main__":
@@ -0,0 +1,31 @@
+// Clientside callbacks, registered with ClientsideFunction in app.py and
+// src/pages/graph.py. They need no data, so they never reach the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    layout: {
+        // Send the bare root URL to the landing page
+        redirect_to_landing: function (pathname) {
+            if (pathname === "/" || pathname === "" || pathname == null) {
+                return "/landing";
+            }
+            return pathname;
+        },
+
+        // Toggle the navbar collapse on small screens
+        toggle_navbar_collapse: function (n, is_open) {
+            if (n) {
+                return !is_open;
+            }
+            return is_open;
+        },
+    },
+
+    graph: {
+        // Exclude the axis selected in the other dropdown, options come from
+        // the numerical-columns store
+        exclude_selected_axis: function (selected, options) {
+            return (options || []).filter(function (option) {
+                return option.value !== selected;
+            });
+        },
+    },
+});
@@ -0,0 +1,92 @@
+"""
+Memory report: bytes per row of the graph dataset before and after compact dtypes
+
+    $ python -m benchmarks.dataset_memory
+    $ python -m benchmarks.dataset_memory --rows 100000 1000000 --columns
+"""
+
+import argparse
+
+import pandas as pd
+from sqlalchemy import create_engine, insert, select
+
+from src.db.dataset import memory_usage, read_orders
+from src.db.fixture import prepare_chunk
+from src.db.generator import SuperstoreModel
+from src.db.model import Order
+
+
+def legacy_read(connection) -> pd.DataFrame:
+    """
+    Read the dataset the way it used to be: every column, object strings and
+    64-bit numbers
+    :param connection: SQLAlchemy connection
+    :return: DataFrame of orders
+    """
+    df = pd.read_sql_query(
+        select(Order.__table__).order_by(Order.id),
+        connection,
+        dtype={
+            "id": "int64",
+            "sales": "float64",
+            "quantity": "Int64",
+            "discount": "float64",
+            "profit": "float64",
+        },
+        parse_dates=["order_date", "dispatch_date"],
+    )
+    df["days_to_ship"] = (df["dispatch_date"] - df["order_date"]).dt.days
+    df["profit_ratio"] = df["profit"] / df["sales"]
+
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument(
+        "--columns", action="store_true", help="Also print bytes per row by column"
+    )
+    args = parser.parse_args()
+
+    model = SuperstoreModel.from_file()
+
+    print(
+        f"{'rows':>12} {'before B/row':>13} {'after B/row':>12} "
+        f"{'before MiB':>11} {'after MiB':>10} {'ratio':>7}"
+    )
+    for rows in args.rows:
+        # In-memory database, so only the DataFrames are measured
+        engine = create_engine("sqlite://")
+        Order.__table__.create(engine)
+        with engine.begin() as connection:
+            for chunk in model.generate(rows, chunk_size=100_000, seed=0):
+                connection.execute(insert(Order), prepare_chunk(chunk))
+
+        with engine.connect() as connection:
+            before = legacy_read(connection)
+            after = read_orders(connection).drop(columns="id")
+        engine.dispose()
+
+        before_total, before_row = memory_usage(before)
+        after_total, after_row = memory_usage(after)
+        print(
+            f"{rows:>12,} {before_row:>13.0f} {after_row:>12.0f} "
+            f"{before_total / 2**20:>11.1f} {after_total / 2**20:>10.1f} "
+            f"{before_total / after_total:>6.1f}x"
+        )
+
+        if args.columns:
+            columns = pd.DataFrame(
+                {
+                    "before": before.memory_usage(deep=True, index=False) / rows,
+                    "after": after.memory_usage(deep=True, index=False) / rows,
+                    "before dtype": before.dtypes.astype(str),
+                    "after dtype": after.dtypes.astype(str),
+                }
+            )
+            print(columns.round(1).fillna("-").to_string(), end="\n\n")
+
+
+if __name__ == "__main__":
+    main()
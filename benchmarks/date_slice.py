@@ -0,0 +1,78 @@
+"""
+Micro-benchmark: boolean date masks vs. searchsorted slicing of the graph dataset
+
+    $ python -m benchmarks.date_slice
+    $ python -m benchmarks.date_slice --rows 1000000 10000000
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from src.db.dataset import date_range_slice
+
+
+def make_orders(rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Orders spread over four years, sorted by order_date like the graph dataset
+    :param rows: Number of rows
+    :param seed: Random seed
+    :return: DataFrame of orders
+    """
+    rng = np.random.default_rng(seed)
+    days = np.sort(rng.integers(0, 4 * 365, rows))
+    return pd.DataFrame(
+        {
+            "order_date": pd.Timestamp("2018-01-01") + pd.to_timedelta(days, unit="D"),
+            "sales": rng.gamma(2.0, 100.0, rows),
+            "profit": rng.normal(20.0, 50.0, rows),
+            "quantity": rng.integers(1, 10, rows),
+        }
+    )
+
+
+def boolean_mask(df: pd.DataFrame, start_date, end_date) -> pd.DataFrame:
+    # What the graph callbacks used to do
+    return df[(df["order_date"] >= start_date) & (df["order_date"] <= end_date)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    start_date = pd.Timestamp("2019-03-01")
+    end_date = pd.Timestamp("2020-08-31")
+
+    print(f"{'rows':>12} {'mask (ms)':>12} {'slice (ms)':>12} {'speedup':>10}")
+    for rows in args.rows:
+        df = make_orders(rows)
+        assert boolean_mask(df, start_date, end_date).equals(
+            date_range_slice(df, start_date, end_date)
+        )
+
+        mask = min(
+            timeit.repeat(
+                lambda: boolean_mask(df, start_date, end_date),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        sliced = min(
+            timeit.repeat(
+                lambda: date_range_slice(df, start_date, end_date),
+                number=1,
+                repeat=args.repeat,
+            )
+        )
+        print(
+            f"{rows:>12,} {mask * 1000:>12.3f} {sliced * 1000:>12.3f} "
+            f"{mask / sliced:>9.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Storage layout benchmark: file size and aggregate query time, wide vs. star schema
+
+    $ python -m benchmarks.storage_layout
+    $ python -m benchmarks.storage_layout --rows 1000000 --repeat 10
+
+Each layout loads the same generated source file into its own SQLite database in
+--work-dir, in its own process with STORAGE_LAYOUT set. The database file is
+measured after a WAL checkpoint, every query reports its median of --repeat runs.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+from loguru import logger
+from sqlalchemy import distinct, func, select, text
+from sqlalchemy.engine import Connection
+
+from benchmarks.suite import make_source
+from src.db.connection import engine, init_db
+from src.db.fixture import load_data_to_db
+from src.db.model import Order
+
+layouts = ("wide", "star")
+
+
+def aggregate_queries(start_date, end_date) -> List[tuple]:
+    """
+    Aggregates the dashboard runs against the orders table
+    :param start_date: First day of the date range queries
+    :param end_date: Last day of the date range queries
+    :return: List of (name, statement)
+    """
+    return [
+        (
+            "overview totals",
+            select(
+                func.count(Order.id),
+                func.sum(Order.sales),
+                func.sum(Order.profit),
+                func.sum(Order.quantity),
+            ),
+        ),
+        (
+            "sales by country",
+            select(Order.country_region, func.sum(Order.sales)).group_by(
+                Order.country_region
+            ),
+        ),
+        (
+            "sales by sub-category",
+            select(Order.category, Order.sub_category, func.sum(Order.sales)).group_by(
+                Order.category, Order.sub_category
+            ),
+        ),
+        (
+            "date range sums",
+            select(func.sum(Order.sales), func.sum(Order.profit)).where(
+                Order.order_date.between(start_date, end_date)
+            ),
+        ),
+        (
+            "distinct customers",
+            select(func.count(distinct(Order.customer_id))),
+        ),
+        (
+            "filter hierarchy",
+            select(Order.country_region, Order.state_province, Order.city).distinct(),
+        ),
+        (
+            "filtered table page",
+            select(Order)
+            .where(Order.country_region == "Germany", Order.category == "Technology")
+            .order_by(Order.id.desc())
+            .limit(25),
+        ),
+    ]
+
+
+def median_ms(connection: Connection, stmt, repeat: int) -> float:
+    """
+    Median wall time of a query, fetching every row
+    :param connection: SQLAlchemy connection
+    :param stmt: Select statement
+    :param repeat: Number of runs
+    :return: Milliseconds
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(stmt).all()
+        timings.append(time.perf_counter() - started)
+
+    return statistics.median(timings) * 1000
+
+
+def run_layout(source: str, database: str, repeat: int) -> dict:
+    """
+    Load the source and time the aggregates, in a process whose DATABASE_URL
+    and STORAGE_LAYOUT point at an empty database of one layout
+    :param source: Path to the source file
+    :param database: Path to the database file
+    :param repeat: Number of runs per query
+    :return: Dict of results
+    """
+    init_db()
+
+    started = time.perf_counter()
+    load_data_to_db(source)
+    ingest = time.perf_counter() - started
+
+    with engine.connect() as connection:
+        connection.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        start_date, end_date = connection.execute(
+            select(func.min(Order.order_date), func.max(Order.order_date))
+        ).one()
+    size = os.path.getsize(database)
+
+    # The last year of orders
+    start_date = end_date.replace(year=end_date.year - 1)
+    queries = {}
+    with engine.connect() as connection:
+        for name, stmt in aggregate_queries(start_date, end_date):
+            queries[name] = median_ms(connection, stmt, repeat)
+
+    return {"ingest_s": ingest, "size_bytes": size, "queries_ms": queries}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--work-dir", default=os.path.join(".cache", "benchmarks"))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    if args.child:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+        result = run_layout(
+            make_source(args.rows, args.work_dir), args.child, args.repeat
+        )
+        with open(args.child_output, "w") as f:
+            json.dump(result, f)
+        return
+
+    # Generate the source once, before the layouts are timed
+    make_source(args.rows, args.work_dir)
+
+    results = {}
+    for layout in layouts:
+        database = os.path.join(args.work_dir, f"layout-{layout}-{args.rows}.db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(database + suffix):
+                os.remove(database + suffix)
+        child_output = os.path.join(args.work_dir, f"layout-{layout}-{args.rows}.json")
+
+        env = dict(os.environ)
+        env.pop("DATABASE_READ_URL", None)
+        env["DATABASE_URL"] = f"sqlite:///{database}"
+        env["STORAGE_LAYOUT"] = layout
+        env["DATASET_SNAPSHOT"] = ""
+
+        print(f"Running {layout} layout, {args.rows:,} rows...", file=sys.stderr)
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.storage_layout",
+                "--child",
+                database,
+                "--child-output",
+                child_output,
+                "--rows",
+                str(args.rows),
+                "--repeat",
+                str(args.repeat),
+                "--work-dir",
+                args.work_dir,
+            ],
+            env=env,
+            check=True,
+        )
+        with open(child_output) as f:
+            results[layout] = json.load(f)
+
+    wide, star = results["wide"], results["star"]
+    print(f"{'':<24} {'wide':>10} {'star':>10} {'star/wide':>10}")
+    print(
+        f"{'file size MiB':<24} {wide['size_bytes'] / 2**20:>10.1f} "
+        f"{star['size_bytes'] / 2**20:>10.1f} "
+        f"{star['size_bytes'] / wide['size_bytes']:>9.2f}x"
+    )
+    print(
+        f"{'ingest s':<24} {wide['ingest_s']:>10.2f} {star['ingest_s']:>10.2f} "
+        f"{star['ingest_s'] / wide['ingest_s']:>9.2f}x"
+    )
+    for name, wide_ms in wide["queries_ms"].items():
+        star_ms = star["queries_ms"][name]
+        print(
+            f"{name + ' ms':<24} {wide_ms:>10.1f} {star_ms:>10.1f} "
+            f"{star_ms / wide_ms:>9.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
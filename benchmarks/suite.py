@@ -0,0 +1,406 @@
+"""
+Benchmark suite: ingest, page layouts and every data callback at several dataset sizes
+
+    $ python -m benchmarks.suite
+    $ python -m benchmarks.suite --rows 10000 1000000 10000000 --repeat 10
+
+Each size runs in its own process against its own SQLite database in --work-dir,
+with the callback cache disabled unless --cache is passed. For every benchmark the
+first (cold) call, the median and the fastest of --repeat warm calls, the peak
+memory traced by tracemalloc during one more call and the size of the JSON
+response are reported, and all results are written to --output for comparing runs.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, List
+
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.development.base_component import Component
+from loguru import logger
+from plotly.io.json import to_json_plotly
+
+from src.db.connection import ReadSessionLocal, init_db
+from src.db.crud import get_overview_metrics
+from src.db.fixture import load_data_to_db
+from src.db.generator import SuperstoreModel, generate_to_parquet
+from src.pages.graph import (
+    graph_page_layout,
+    update_bubble_chart,
+    update_timeline_graph,
+)
+from src.pages.landing import update_metrics
+from src.pages.table import (
+    set_dropdown_options,
+    update_table_and_row_id,
+    update_table_data,
+)
+
+
+def make_source(rows: int, work_dir: str) -> str:
+    """
+    Generate a Parquet source file of rows synthetic orders, reused by later runs
+    :param rows: Number of orders
+    :param work_dir: Directory for generated files
+    :return: Path to the Parquet file
+    """
+    path = os.path.join(work_dir, f"orders-{rows}.parquet")
+    if not os.path.exists(path):
+        temp_path = f"{path}.tmp"
+        generate_to_parquet(SuperstoreModel.from_file(), rows, temp_path, seed=0)
+        os.replace(temp_path, path)
+
+    return path
+
+
+def set_triggered(prop_id: str):
+    """
+    Fake the callback context Dash sets up for a request
+    :param prop_id: Triggering property, e.g. "add-button.n_clicks"
+    """
+    context_value.set(
+        AttributeDict(triggered_inputs=[{"prop_id": prop_id, "value": 1}])
+    )
+
+
+def payload_bytes(result) -> int:
+    """
+    Size of a callback or layout response as Dash serializes it
+    :param result: Return value of the callback or layout function
+    :return: Number of bytes of JSON
+    """
+    if isinstance(result, Component):
+        result = result.to_plotly_json()
+    return len(to_json_plotly(result).encode())
+
+
+def measure(name: str, func: Callable, make_args: Callable, repeat: int, trigger=""):
+    """
+    Time a function cold and warm, then trace its peak memory
+    :param name: Benchmark name
+    :param func: Function to call
+    :param make_args: Returns the positional arguments for the nth call
+    :param repeat: Number of warm calls
+    :param trigger: Property reported as triggering the callback
+    :return: Dict of results
+    """
+    set_triggered(trigger)
+    calls = iter(range(repeat + 2))
+
+    started = time.perf_counter()
+    result = func(*make_args(next(calls)))
+    first = time.perf_counter() - started
+
+    timings = []
+    for _ in range(repeat):
+        args = make_args(next(calls))
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+
+    args = make_args(next(calls))
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "benchmark": name,
+        "first_ms": first * 1000,
+        "median_ms": statistics.median(timings) * 1000 if timings else None,
+        "min_ms": min(timings) * 1000 if timings else None,
+        "peak_memory_bytes": peak,
+        "payload_bytes": payload_bytes(result),
+    }
+
+
+def measure_ingest(source: str) -> dict:
+    """
+    Time one load of the source file into the empty database, under tracemalloc
+    :param source: Path to the source file
+    :return: Dict of results
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    load_data_to_db(source)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "benchmark": "load_data_to_db",
+        "first_ms": elapsed * 1000,
+        "median_ms": None,
+        "min_ms": None,
+        "peak_memory_bytes": peak,
+        "payload_bytes": None,
+    }
+
+
+def run_size(rows: int, source: str, repeat: int) -> List[dict]:
+    """
+    Ingest rows orders and run every benchmark, in a process whose
+    DATABASE_URL points at an empty database
+    :param rows: Number of orders
+    :param source: Path to the source file
+    :param repeat: Number of warm calls per benchmark
+    :return: List of result dicts
+    """
+    init_db()
+    results = [measure_ingest(source)]
+
+    with ReadSessionLocal() as session:
+        metrics = get_overview_metrics(session)
+    start_date = metrics["start_date"].isoformat()
+    end_date = metrics["end_date"].isoformat()
+
+    def add_record_args(n: int) -> tuple:
+        record = [
+            f"BENCH-{rows}-{n}",
+            end_date,
+            end_date,
+            "Standard Class",
+            "BN-10000",
+            "Bench Customer",
+            "Consumer",
+            "Berlin",
+            "Berlin",
+            "Germany",
+            "Central",
+            "OFF-BE-10000000",
+            "Office Supplies",
+            "Binders",
+            "Bench Binder",
+            100.0,
+            2,
+            0.1,
+            10.0,
+        ]
+        return (
+            "",
+            n + 1,
+            *record,
+            None,
+            None,
+            None,
+            None,
+            None,
+            0,
+            25,
+            [],
+            "",
+            None,
+            rows,
+        )
+
+    benchmarks = [
+        (
+            "update_metrics (get_overview_metrics)",
+            update_metrics,
+            lambda n: ("/landing",),
+            "",
+        ),
+        ("graph_page_layout", graph_page_layout, lambda n: (), ""),
+        (
+            "set_dropdown_options",
+            set_dropdown_options,
+            lambda n: ("Germany", "Berlin", "Technology"),
+            "",
+        ),
+        (
+            "update_table_data",
+            update_table_data,
+            lambda n: (None, None, None, None, None, 25, 0, [], "", None),
+            "",
+        ),
+        (
+            "update_table_data (sorted, filtered)",
+            update_table_data,
+            lambda n: (
+                "Germany",
+                None,
+                None,
+                None,
+                None,
+                25,
+                0,
+                [{"column_id": "sales", "direction": "desc"}],
+                "{profit} > 0",
+                None,
+            ),
+            "",
+        ),
+        (
+            "update_table_data (search)",
+            update_table_data,
+            lambda n: (None, None, None, None, None, 25, 0, [], "", "binder"),
+            "",
+        ),
+        (
+            "update_table_and_row_id (navigate)",
+            update_table_and_row_id,
+            lambda n: (
+                "",
+                0,
+                *[None] * 19,
+                None,
+                None,
+                None,
+                None,
+                None,
+                0,
+                25,
+                [],
+                "",
+                None,
+                rows,
+            ),
+            "page-content.children",
+        ),
+        (
+            "update_table_and_row_id (add)",
+            update_table_and_row_id,
+            add_record_args,
+            "add-button.n_clicks",
+        ),
+        (
+            "update_timeline_graph",
+            update_timeline_graph,
+            lambda n: (start_date, end_date, "ME"),
+            "",
+        ),
+        (
+            "update_bubble_chart",
+            update_bubble_chart,
+            lambda n: ("sales", "profit", "category", start_date, end_date),
+            "",
+        ),
+    ]
+
+    for name, func, make_args, trigger in benchmarks:
+        results.append(measure(name, func, make_args, repeat, trigger))
+
+    return results
+
+
+def print_results(results: List[dict]):
+    """
+    Print results as a table
+    :param results: Result dicts with a rows key
+    """
+
+    def number(value, unit=1.0, digits=1):
+        return "-" if value is None else f"{value / unit:,.{digits}f}"
+
+    print(
+        f"{'rows':>12} {'benchmark':<38} {'first ms':>10} {'median ms':>10} "
+        f"{'min ms':>10} {'peak MiB':>9} {'payload KiB':>12}"
+    )
+    for result in results:
+        print(
+            f"{result['rows']:>12,} {result['benchmark']:<38} "
+            f"{number(result['first_ms']):>10} {number(result['median_ms']):>10} "
+            f"{number(result['min_ms']):>10} "
+            f"{number(result['peak_memory_bytes'], 1024 * 1024):>9} "
+            f"{number(result['payload_bytes'], 1024):>12}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--work-dir", default=os.path.join(".cache", "benchmarks"))
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="JSON results file, defaults to a timestamped file in --work-dir",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="Keep the callback cache enabled, warm calls then measure cache hits",
+    )
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.makedirs(args.work_dir, exist_ok=True)
+
+    if args.child:
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+        source = make_source(args.child, args.work_dir)
+        results = run_size(args.child, source, args.repeat)
+        with open(args.child_output, "w") as f:
+            json.dump(results, f)
+        return
+
+    results = []
+    for rows in args.rows:
+        database = os.path.join(args.work_dir, f"bench-{rows}.db")
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(database + suffix):
+                os.remove(database + suffix)
+        child_output = os.path.join(args.work_dir, f"results-{rows}.json")
+
+        env = dict(os.environ)
+        env.pop("DATABASE_READ_URL", None)
+        env["DATABASE_URL"] = f"sqlite:///{database}"
+        env["DATASET_SNAPSHOT"] = os.path.join(args.work_dir, f"orders-{rows}.arrow")
+        if not args.cache:
+            env["CALLBACK_CACHE"] = "none"
+
+        print(f"Running {rows:,} rows...", file=sys.stderr)
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.suite",
+                "--child",
+                str(rows),
+                "--child-output",
+                child_output,
+                "--repeat",
+                str(args.repeat),
+                "--work-dir",
+                args.work_dir,
+            ],
+            env=env,
+            check=True,
+        )
+        with open(child_output) as f:
+            results.extend({"rows": rows, **result} for result in json.load(f))
+
+    output = args.output or os.path.join(
+        args.work_dir, f"results-{datetime.now():%Y%m%d-%H%M%S}.json"
+    )
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "cache": args.cache,
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+
+    print_results(results)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
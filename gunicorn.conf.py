@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+
+# Gunicorn settings, run with: gunicorn -c gunicorn.conf.py
+wsgi_app = "wsgi:server"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("THREADS", 4))
+timeout = int(os.environ.get("TIMEOUT", 60))
+
+# Import the app and warm the caches once in the master, forked workers then
+# share the loaded pages and graph dataset copy-on-write
+preload_app = os.environ.get("PRELOAD", "1") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        from src.db.connection import engine, read_engine
+        from src.server import warm_caches
+
+        warm_caches()
+        # Don't hand the master's pooled connections to the workers
+        engine.dispose()
+        read_engine.dispose()
+
+
+def post_fork(server, worker):
+    from src.db.connection import engine, read_engine
+
+    engine.dispose(close=False)
+    read_engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from src.server import warm_caches_in_background
+
+        warm_caches_in_background()
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,195 @@
+import hashlib
+import json
+from datetime import date
+from typing import Iterator, List, Optional
+from urllib.parse import urlencode
+
+from flask import Flask, Response, abort, request
+from sqlalchemy.orm import Session
+
+from src.db.connection import ReadSessionLocal
+from src.db.crud import filter_orders, parse_filter_query
+from src.db.model import Order
+from src.db.search import search_orders
+from src.db.version import get_data_version
+from src.export import export_filters
+
+api_default_limit = 1000
+api_max_limit = 10000
+
+api_columns = Order.__table__.columns.keys()
+
+
+def query_arg(name: str, parse, default=None):
+    """
+    Parse a query parameter, answering 400 Bad Request if it is invalid
+    :param name: Parameter name
+    :param parse: Function converting the string value
+    :param default: Value if the parameter is missing or empty
+    :return: Parsed value
+    """
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return parse(value)
+    except ValueError:
+        abort(400, f"Invalid {name}: {value}")
+
+
+def get_orders_after(
+    session: Session,
+    filters: dict,
+    filter_query: Optional[str],
+    search: Optional[str],
+    start_date: Optional[date],
+    end_date: Optional[date],
+    after: int,
+    limit: int,
+) -> List[tuple]:
+    """
+    Seek to the orders after an id, so every page costs the same however deep
+    :param session: SQLAlchemy session object
+    :param filters: Mapping of Order column name to selected value
+    :param filter_query: DataTable filter_query string
+    :param search: Full-text search
+    :param start_date: First order date, inclusive
+    :param end_date: Last order date, inclusive
+    :param after: Last id of the previous page, 0 for the first page
+    :param limit: Page size
+    :return: Row tuples in Order column order, by ascending id
+    """
+    query = filter_orders(session.query(*Order.__table__.columns), filters)
+    query = query.filter(Order.id > after, *parse_filter_query(filter_query))
+    query = search_orders(query, search)
+    if start_date:
+        query = query.filter(Order.order_date >= start_date)
+    if end_date:
+        query = query.filter(Order.order_date <= end_date)
+
+    return query.order_by(Order.id).limit(limit).all()
+
+
+def page_etag(version: int, params: dict) -> str:
+    """
+    Entity tag of one page of the API
+    :param version: Data version the page was read at
+    :param params: Normalized query parameters
+    :return: ETag, unquoted
+    """
+    payload = json.dumps([version, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def json_value(value):
+    """
+    JSON representation of an Order column value
+    :param value: Column value
+    :return: ISO string for dates, the value otherwise
+    """
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def json_chunks(rows: List[tuple], next_url: Optional[str]) -> Iterator[str]:
+    """
+    Encode a page as one JSON document, column names once and rows as arrays
+    :param rows: Row tuples
+    :param next_url: Link to the next page, None on the last page
+    :return: Iterator of JSON text
+    """
+    yield f'{{"columns":{json.dumps(api_columns, separators=(",", ":"))},"data":['
+    for index, row in enumerate(rows):
+        values = json.dumps([json_value(value) for value in row], separators=(",", ":"))
+        yield values if index == 0 else f",{values}"
+    yield f'],"next":{json.dumps(next_url)}}}'
+
+
+def ndjson_chunks(rows: List[tuple]) -> Iterator[str]:
+    """
+    Encode a page as newline-delimited JSON, one object per order
+    :param rows: Row tuples
+    :return: Iterator of JSON lines
+    """
+    for row in rows:
+        record = {column: json_value(value) for column, value in zip(api_columns, row)}
+        yield json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def register_api_routes(server: Flask):
+    """
+    Add the read-only GET /api/orders endpoint. It takes the table page's
+    dropdown filters, filter_query and search, start_date and end_date, and
+    pages by id with after and limit. Responses are JSON, or NDJSON with
+    format=ndjson or an Accept: application/x-ndjson header, and carry the
+    next page in a Link header and an ETag for If-None-Match
+    :param server: Flask server, app.server
+    """
+
+    @server.route("/api/orders")
+    def api_orders():
+        filters = {column: request.args.get(column) for column in export_filters}
+        filter_query = request.args.get("filter_query")
+        search = request.args.get("search")
+        start_date = query_arg("start_date", date.fromisoformat)
+        end_date = query_arg("end_date", date.fromisoformat)
+        after = query_arg("after", int, 0)
+        limit = min(max(query_arg("limit", int, api_default_limit), 1), api_max_limit)
+
+        response_format = request.args.get("format")
+        if not response_format:
+            accepts_ndjson = request.accept_mimetypes["application/x-ndjson"]
+            response_format = "ndjson" if accepts_ndjson else "json"
+        if response_format not in ("json", "ndjson"):
+            abort(400, f"Invalid format: {response_format}")
+
+        with ReadSessionLocal() as session:
+            # Same read transaction, so the version matches the rows
+            version, base_version = get_data_version(session)
+            rows = get_orders_after(
+                session,
+                filters,
+                filter_query,
+                search,
+                start_date,
+                end_date,
+                after,
+                limit,
+            )
+
+        params = {
+            key: value
+            for key, value in request.args.items()
+            if key not in ("after", "limit", "format") and value
+        }
+        next_url = None
+        if len(rows) == limit:
+            next_url = "/api/orders?" + urlencode(
+                {**params, "after": rows[-1][0], "limit": limit}
+            )
+
+        # New orders are only ever appended past the highest id, so a full page
+        # keeps its rows until an update or delete bumps the base version. The
+        # row count tells a page that filled up from the partial page it was
+        etag = page_etag(
+            base_version if next_url else version,
+            {
+                **params,
+                "after": after,
+                "limit": limit,
+                "format": response_format,
+                "rows": len(rows),
+            },
+        )
+        headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+        if next_url:
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        if response_format == "ndjson":
+            body, mimetype = ndjson_chunks(rows), "application/x-ndjson"
+        else:
+            body, mimetype = json_chunks(rows, next_url), "application/json"
+
+        return Response(body, mimetype=mimetype, headers=headers)
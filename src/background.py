@@ -0,0 +1,111 @@
+import functools
+import os
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from dash import DiskcacheManager, callback
+from loguru import logger
+
+from src.cache import MemoryBackend, callback_cache
+from src.db.connection import engine, read_engine
+from src.db.dataset import orders_dataset
+
+# Reports progress of the background callback running in this process
+progress_reporter: ContextVar[Optional[Callable]] = ContextVar(
+    "progress_reporter", default=None
+)
+
+
+class DatasetManager(DiskcacheManager):
+    """
+    DiskcacheManager that catches the graph dataset up with the database in the
+    request worker before forking a job. Whatever a job loads is lost when it
+    exits, so it would otherwise reload the dataset after every write
+    """
+
+    def call_job_fn(self, key, job_fn, args, context):
+        orders_dataset.get()
+        return super().call_job_fn(key, job_fn, args, context)
+
+
+def create_manager() -> Optional[DiskcacheManager]:
+    """
+    Create the background callback manager configured by the environment
+    :return: DatasetManager, or None to run heavy callbacks in the request worker
+    """
+    if os.environ.get("BACKGROUND_CALLBACKS", "0") != "1":
+        return None
+
+    if isinstance(callback_cache, MemoryBackend):
+        logger.warning(
+            "BACKGROUND_CALLBACKS=1 with CALLBACK_CACHE=memory: results computed "
+            "in background jobs are not cached, set CALLBACK_CACHE=disk"
+        )
+
+    import diskcache
+
+    cache = diskcache.Cache(
+        os.environ.get("BACKGROUND_CALLBACKS_DIR", ".cache/background")
+    )
+    return DatasetManager(
+        cache, expire=int(os.environ.get("BACKGROUND_CALLBACKS_EXPIRE", 600))
+    )
+
+
+background_manager = create_manager()
+
+
+def report_progress(value: int, label: str):
+    """
+    Report progress of the current background callback, a no-op otherwise
+    :param value: Percentage done
+    :param label: Step being worked on
+    """
+    reporter = progress_reporter.get()
+    if reporter is not None:
+        reporter((value, label))
+
+
+def background_callback(*dependencies, progress=None, running=None, cancel=None):
+    """
+    Register a callback that runs in a background process when
+    BACKGROUND_CALLBACKS=1, and as a regular callback otherwise. Dash cancels
+    a running job when its inputs change again or a cancel input fires.
+    The decorated function keeps its signature and reports progress with
+    report_progress
+    :param dependencies: Outputs and inputs, as for dash.callback
+    :param progress: Outputs set to (value, label) by report_progress
+    :param running: (Output, value while running, value after) tuples
+    :param cancel: Inputs that cancel a running job
+    :return: Decorator returning the function unchanged
+    """
+
+    def decorator(func):
+        if background_manager is None:
+            callback(*dependencies)(func)
+            return func
+
+        @functools.wraps(func)
+        def run_in_background(set_progress, *args):
+            # The job is a forked process, don't share the parent's connections
+            engine.dispose(close=False)
+            read_engine.dispose(close=False)
+
+            token = progress_reporter.set(set_progress)
+            try:
+                return func(*args)
+            finally:
+                progress_reporter.reset(token)
+
+        callback(
+            *dependencies,
+            background=True,
+            manager=background_manager,
+            progress=progress,
+            progress_default=[0, ""],
+            running=running,
+            cancel=cancel,
+        )(run_in_background)
+        return func
+
+    return decorator
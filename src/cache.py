@@ -0,0 +1,147 @@
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import diskcache
+from plotly.basedatatypes import BaseFigure
+
+from src.db.connection import read_engine
+from src.db.version import get_data_version, get_database_id
+
+# Returned by backends on a cache miss, cached values may be None
+missing = object()
+
+
+class MemoryBackend:
+    """
+    Per-process LRU cache with a time to live
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._lock = threading.Lock()
+        self._data: OrderedDict = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._data.get(key, missing)
+            if item is missing:
+                return missing
+
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return missing
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskBackend:
+    """
+    LRU cache with a time to live in a local directory, shared by every process
+    on the host, e.g. gunicorn workers
+    """
+
+    def __init__(self, directory: str, size_limit: int, ttl: float):
+        self._cache = diskcache.Cache(
+            directory, size_limit=size_limit, eviction_policy="least-recently-used"
+        )
+        self.ttl = ttl
+
+    def get(self, key: str):
+        return self._cache.get(key, default=missing)
+
+    def set(self, key: str, value):
+        # Store plotly figures as plain dicts, unpickling a Figure re-validates
+        # every trace and is about as slow as building it
+        if isinstance(value, BaseFigure):
+            value = value.to_dict()
+        self._cache.set(key, value, expire=self.ttl)
+
+    def clear(self):
+        self._cache.clear()
+
+
+def create_backend():
+    """
+    Create the callback cache backend configured by the environment
+    :return: MemoryBackend, DiskBackend or None if caching is disabled
+    """
+    kind = os.environ.get("CALLBACK_CACHE", "memory")
+    ttl = float(os.environ.get("CALLBACK_CACHE_TTL", 300))
+
+    if kind == "disk":
+        return DiskBackend(
+            os.environ.get("CALLBACK_CACHE_DIR", ".cache/callbacks"),
+            int(os.environ.get("CALLBACK_CACHE_SIZE_MB", 256)) * 1024 * 1024,
+            ttl,
+        )
+    if kind == "memory":
+        return MemoryBackend(
+            int(os.environ.get("CALLBACK_CACHE_MAX_ENTRIES", 256)), ttl
+        )
+    return None
+
+
+callback_cache = create_backend()
+
+
+def cache_key(func, args, kwargs, database_id: Optional[str], version: int) -> str:
+    """
+    Key for one call of a memoized function at a data version of a database.
+    The disk cache is shared by every app on the host, so the database is part
+    of the key
+    :return: Hex digest of the function name, arguments, database id and version
+    """
+    payload = json.dumps(
+        [func.__module__, func.__qualname__, args, kwargs, database_id, version],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def memoize(func):
+    """
+    Cache the results of a function of its arguments and the orders table.
+    Entries are keyed on the data version, so writes that bump it invalidate
+    every cached result, and on the database id, so another database at the
+    same URL or sharing the disk cache never reads them
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if callback_cache is None:
+            return func(*args, **kwargs)
+
+        with read_engine.connect() as connection:
+            database_id = get_database_id(connection)
+            version = get_data_version(connection)[0]
+
+        key = cache_key(func, args, kwargs, database_id, version)
+        value = callback_cache.get(key)
+        if value is missing:
+            value = func(*args, **kwargs)
+            callback_cache.set(key, value)
+
+        return value
+
+    return wrapper
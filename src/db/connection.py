@@ -1,11 +1,98 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from src.db import search, star, version
+from src.db.model import Base, Order
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///superstore.db")
+# Optional replica for the dashboard's read callbacks
+DATABASE_READ_URL = os.environ.get("DATABASE_READ_URL", DATABASE_URL)
+# "wide" orders table, or "star" dimension and fact tables behind an orders view
+STORAGE_LAYOUT = os.environ.get("STORAGE_LAYOUT", "wide")
+
+# Applied to every new SQLite connection
+sqlite_pragmas = {
+    "journal_mode": os.environ.get("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    # Negative values are KiB, so -65536 is 64 MiB of page cache
+    "cache_size": int(os.environ.get("SQLITE_CACHE_SIZE", -65536)),
+    "temp_store": "MEMORY",
+}
+
+
+def create_db_engine(url: str, read_only: bool = False) -> Engine:
+    """
+    Create an engine with pool and, for SQLite, pragma settings from the environment
+    :param url: Database URL
+    :param read_only: Reject writes on this engine's connections
+    :return: SQLAlchemy engine
+    """
+    pool_options = {}
+    # In-memory SQLite uses SingletonThreadPool, which takes no size settings
+    parsed_url = make_url(url)
+    if issubclass(parsed_url.get_dialect().get_pool_class(parsed_url), QueuePool):
+        pool_options = {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 5)),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+            "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        }
 
-from src.db.model import Base
+    db_engine = create_engine(
+        url,
+        # Server databases may drop idle connections, a file can't
+        pool_pre_ping=not url.startswith("sqlite"),
+        **pool_options,
+    )
 
-DATABASE_URL = "sqlite:///superstore.db"
+    if db_engine.dialect.name == "sqlite":
 
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(engine)
+        @event.listens_for(db_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma, value in sqlite_pragmas.items():
+                cursor.execute(f"PRAGMA {pragma}={value}")
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+            cursor.close()
+
+    return db_engine
+
+
+# Engine for writes (add record, ingest, migrations)
+engine = create_db_engine(DATABASE_URL)
+# Engine for the dashboard's read callbacks, so readers never take write locks
+read_engine = create_db_engine(DATABASE_READ_URL, read_only=True)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def init_db():
+    """
+    Create any missing tables, call once at startup before serving or ingesting
+    """
+    tables = None
+    if STORAGE_LAYOUT == "star":
+        star.init_star_schema(engine)
+        tables = [
+            table
+            for table in Base.metadata.sorted_tables
+            if table is not Order.__table__
+        ]
+    elif (
+        engine.dialect.name == "sqlite" and "orders" in inspect(engine).get_view_names()
+    ):
+        raise RuntimeError("The database uses the star layout, set STORAGE_LAYOUT=star")
+    Base.metadata.create_all(engine, tables=tables)
+    with engine.begin() as connection:
+        version.ensure_database_id(connection)
+
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as connection:
+            search.create_search_index(connection)
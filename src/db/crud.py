@@ -1,25 +1,50 @@
+import math
 import os
-from typing import List
+import re
+import threading
+from datetime import date
+from typing import List, Optional, Tuple
 
 import pandas as pd
+from loguru import logger
 from pandas import DataFrame
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import Date, Float, Integer, String, cast, func
+from sqlalchemy.orm import Query, Session
 
 from src.db.model import Order
+from src.db.search import search_orders, search_rank
+from src.db.version import get_data_version
 
 path = os.path.dirname(os.path.abspath(__file__))
 data_file_path = os.path.join(path, "data", "(GB) Sample - EU Superstore.xls")
 
+# Matches one clause of a DataTable filter_query, e.g. `{sales} >= 100`
+filter_clause_regex = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s+"
+    r"(?P<operator>[a-z]+|[si]?(?:[<>!]?=|[<>]))\s+(?P<value>.+)$"
+)
+filter_operators = ("eq", "ne", "lt", "le", "gt", "ge", "contains")
+filter_symbols = ("=", "!=", "<", "<=", ">", ">=")
+
+# Summary cache for the landing page cards, see get_overview_metrics
+overview_metrics_lock = threading.Lock()
+overview_metrics_cache: dict = {}
+
 
 def load_data(file_path: str = data_file_path) -> DataFrame:
     """
-    Load data from an Excel file
-    :param file_path:
-    :return:
+    Load data from a CSV, Parquet or Excel file
+    :param file_path: Path to the source file
+    :return: DataFrame sorted by Row ID, newest first
     """
-    xls = pd.ExcelFile(file_path)
-    df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == ".csv":
+        df = pd.read_csv(file_path)
+    elif extension == ".parquet":
+        df = pd.read_parquet(file_path)
+    else:
+        xls = pd.ExcelFile(file_path)
+        df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
     df["Order Date"] = pd.to_datetime(df["Order Date"])
     df["Dispatch Date"] = pd.to_datetime(df["Dispatch Date"])
     df = df.sort_values(by="Row ID", ascending=False)
@@ -41,40 +66,81 @@ def save_data(df: DataFrame, file_path: str = data_file_path):
     print(f"Data saved to {file_path}")
 
 
-def get_overview_metrics(session: Session) -> dict:
+def compute_overview_metrics(session: Session) -> dict:
     """
-    Get overview metrics from the database
+    Compute overview metrics with a single aggregate query
     :param session: SQLAlchemy session object
     :return: Dictionary with metrics
     """
-    # Total orders
-    total_orders = session.query(func.count(Order.id)).scalar()
-
-    # Total sales
-    total_sales = session.query(func.sum(Order.sales)).scalar() or 0.0
-
-    # Total profit
-    total_profit = session.query(func.sum(Order.profit)).scalar() or 0.0
-
-    # Profit ratio
-    profit_ratio = (total_profit / total_sales * 100) if total_sales != 0 else 0.0
-
-    # Date range
-    start_date = session.query(func.min(Order.order_date)).scalar()
-    end_date = session.query(func.max(Order.order_date)).scalar()
+    total_orders, total_sales, total_profit, start_date, end_date = session.query(
+        func.count(Order.id),
+        func.sum(Order.sales),
+        func.sum(Order.profit),
+        func.min(Order.order_date),
+        func.max(Order.order_date),
+    ).one()
 
-    data = {
+    return {
         "total_orders": total_orders,
-        "total_sales": total_sales,
-        "total_profit": total_profit,
-        "profit_ratio": profit_ratio,
+        "total_sales": total_sales or 0.0,
+        "total_profit": total_profit or 0.0,
         "start_date": start_date,
         "end_date": end_date,
     }
 
+
+def get_overview_metrics(session: Session) -> dict:
+    """
+    Get overview metrics, served from the summary cache while the data version
+    is unchanged
+    :param session: SQLAlchemy session object
+    :return: Dictionary with metrics
+    """
+    version = get_data_version(session)[0]
+
+    with overview_metrics_lock:
+        if overview_metrics_cache.get("version") != version:
+            overview_metrics_cache.update(compute_overview_metrics(session))
+            overview_metrics_cache["version"] = version
+        data = dict(overview_metrics_cache)
+    data.pop("version")
+
+    # Profit ratio
+    total_sales = data["total_sales"]
+    data["profit_ratio"] = (
+        (data["total_profit"] / total_sales * 100) if total_sales != 0 else 0.0
+    )
+
     return data
 
 
+def update_overview_metrics(order: Order, version: int):
+    """
+    Add a newly inserted order to the cached overview metrics
+    :param order: Order that was just committed
+    :param version: Data version written together with the order
+    """
+    with overview_metrics_lock:
+        if overview_metrics_cache.get("version") != version - 1:
+            # Missed another write, recompute on next use
+            overview_metrics_cache.clear()
+            return
+
+        overview_metrics_cache["version"] = version
+        overview_metrics_cache["total_orders"] += 1
+        overview_metrics_cache["total_sales"] += order.sales or 0.0
+        overview_metrics_cache["total_profit"] += order.profit or 0.0
+        if order.order_date:
+            start_date = overview_metrics_cache["start_date"]
+            end_date = overview_metrics_cache["end_date"]
+            overview_metrics_cache["start_date"] = min(
+                filter(None, (start_date, order.order_date))
+            )
+            overview_metrics_cache["end_date"] = max(
+                filter(None, (end_date, order.order_date))
+            )
+
+
 def order_to_dict(orders: List[Order]) -> List[dict]:
     return [
         {
@@ -101,3 +167,188 @@ def order_to_dict(orders: List[Order]) -> List[dict]:
         }
         for order in orders
     ]
+
+
+def filter_orders(query: Query, filters: dict) -> Query:
+    """
+    Apply exact-match dropdown filters to an Order query
+    :param query: SQLAlchemy query over Order
+    :param filters: Mapping of Order column name to selected value
+    :return: Filtered query
+    """
+    for column, value in filters.items():
+        if value:
+            query = query.filter(getattr(Order, column) == value)
+
+    return query
+
+
+def parse_filter_value(column_type, value: str):
+    """
+    Convert a filter_query value to the Python type of a column
+    :param column_type: SQLAlchemy type of the Order column
+    :param value: Raw value from the filter_query
+    :return: Typed value
+    """
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'`":
+        value = value[1:-1]
+
+    if isinstance(column_type, Integer):
+        # Compare with the float, int() would truncate 2.5 to 2
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    if isinstance(column_type, Float):
+        return float(value)
+    if isinstance(column_type, Date):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def parse_filter_query(filter_query: Optional[str]) -> list:
+    """
+    Translate a DataTable filter_query into SQLAlchemy filter clauses
+    :param filter_query: Filter string, e.g. `{city} contains Lon && {sales} > 100`
+    :return: List of SQLAlchemy filter clauses
+    """
+    clauses = []
+    if not filter_query:
+        return clauses
+
+    for part in filter_query.split(" && "):
+        match = filter_clause_regex.match(part.strip())
+        if not match or match["column"] not in Order.__table__.columns:
+            logger.warning(f"Ignoring unparsable filter clause: {part}")
+            continue
+
+        column = Order.__table__.columns[match["column"]]
+        operator = match["operator"]
+        # Case prefixes (s=, ieq, scontains, ...) are ignored, SQLite LIKE is
+        # case-insensitive and equality is always case-sensitive
+        if operator[:1] in ("i", "s") and (
+            operator[1:] in filter_operators or operator[1:] in filter_symbols
+        ):
+            operator = operator[1:]
+        if operator not in filter_operators + filter_symbols + ("datestartswith",):
+            logger.warning(f"Ignoring unsupported filter operator: {part}")
+            continue
+
+        try:
+            if operator in ("contains", "datestartswith"):
+                value = parse_filter_value(String(), match["value"])
+            else:
+                value = parse_filter_value(column.type, match["value"])
+        except ValueError:
+            logger.warning(f"Ignoring filter clause with an invalid value: {part}")
+            continue
+
+        if operator in ("=", "eq"):
+            clauses.append(column == value)
+        elif operator in ("!=", "ne"):
+            clauses.append(column != value)
+        elif operator in ("<", "lt"):
+            clauses.append(column < value)
+        elif operator in ("<=", "le"):
+            clauses.append(column <= value)
+        elif operator in (">", "gt"):
+            clauses.append(column > value)
+        elif operator in (">=", "ge"):
+            clauses.append(column >= value)
+        elif operator == "contains":
+            clauses.append(cast(column, String).contains(value, autoescape=True))
+        elif operator == "datestartswith":
+            clauses.append(cast(column, String).startswith(value, autoescape=True))
+
+    return clauses
+
+
+def sort_clauses(sort_by: Optional[List[dict]]) -> list:
+    """
+    Translate a DataTable sort_by into ORDER BY clauses, newest orders first
+    within equal values
+    :param sort_by: DataTable sort_by list of column_id/direction dicts
+    :return: List of SQLAlchemy order by clauses
+    """
+    order_by = []
+    for sort in sort_by or []:
+        column = Order.__table__.columns.get(sort.get("column_id"))
+        if column is not None:
+            order_by.append(
+                column.desc() if sort.get("direction") == "desc" else column
+            )
+    order_by.append(Order.id.desc())
+
+    return order_by
+
+
+def get_orders_page(
+    session: Session,
+    filters: dict,
+    page_current: int = 0,
+    page_size: int = 25,
+    sort_by: Optional[List[dict]] = None,
+    filter_query: Optional[str] = None,
+    search: Optional[str] = None,
+) -> Tuple[List[dict], int]:
+    """
+    Get a single page of orders with filtering and sorting done in SQL
+    :param session: SQLAlchemy session object
+    :param filters: Mapping of Order column name to selected value
+    :param page_current: Zero-based page number
+    :param page_size: Number of rows per page
+    :param sort_by: DataTable sort_by list of column_id/direction dicts
+    :param filter_query: DataTable filter_query string
+    :param search: Full-text search, results are ranked after the sort_by columns
+    :return: Tuple of (rows for the page, total number of matching rows)
+    """
+    query = filter_orders(session.query(Order), filters)
+    query = query.filter(*parse_filter_query(filter_query))
+    query = search_orders(query, search)
+
+    total = query.with_entities(func.count(Order.id)).order_by(None).scalar() or 0
+
+    # Best matches first, within equal values of the sort_by columns
+    order_by = sort_clauses(sort_by)
+    order_by[-1:-1] = search_rank(query, search)
+
+    orders = (
+        query.order_by(*order_by)
+        .offset(max(page_current or 0, 0) * page_size)
+        .limit(page_size)
+        .all()
+    )
+
+    return order_to_dict(orders), total
+
+
+def order_matches(
+    session: Session,
+    order_id: int,
+    filters: dict,
+    filter_query: Optional[str] = None,
+    search: Optional[str] = None,
+) -> bool:
+    """
+    Check whether an order passes the dropdown filters, filter_query and search
+    :param session: SQLAlchemy session object
+    :param order_id: Order primary key
+    :param filters: Mapping of Order column name to selected value
+    :param filter_query: DataTable filter_query string
+    :param search: Full-text search
+    :return: True if the order would be in the filtered result set
+    """
+    query = filter_orders(session.query(Order.id), filters)
+    query = query.filter(Order.id == order_id, *parse_filter_query(filter_query))
+    query = search_orders(query, search)
+
+    return query.first() is not None
+
+
+def get_page_count(total: int, page_size: int) -> int:
+    """
+    Number of pages needed to show total rows
+    :param total: Total number of rows
+    :param page_size: Number of rows per page
+    :return: Page count, at least 1
+    """
+    return max(math.ceil(total / page_size), 1)
@@ -0,0 +1,370 @@
+import os
+import threading
+from typing import Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+from loguru import logger
+from pandas import DataFrame
+from sqlalchemy import select
+
+from src.db.connection import read_engine
+from src.db.model import Order
+from src.db.version import get_data_version, get_database_id
+
+# Order columns the graph page reads, identifiers and places are left out
+dataset_columns = [
+    "id",
+    "order_date",
+    "dispatch_date",
+    "delivery_mode",
+    "customer_name",
+    "segment",
+    "category",
+    "sub_category",
+    "product_name",
+    "sales",
+    "quantity",
+    "discount",
+    "profit",
+]
+# Breakdown columns with few distinct values, stored as categorical codes
+category_columns = [
+    "delivery_mode",
+    "customer_name",
+    "segment",
+    "category",
+    "sub_category",
+    "product_name",
+]
+# Column dtypes of the graph dataset, dates are parsed separately
+dataset_dtypes = {
+    "id": "int64",
+    "sales": "float32",
+    "quantity": "Int64",
+    "discount": "float32",
+    "profit": "float32",
+    **{column: "category" for column in category_columns},
+}
+date_columns = ["order_date", "dispatch_date"]
+
+# Arrow IPC file the dataset is memory-mapped from at startup, empty to disable
+snapshot_path = os.environ.get("DATASET_SNAPSHOT", ".cache/orders.arrow")
+# Bumped when the dataset columns or dtypes change, older snapshots are ignored
+snapshot_format = 3
+
+
+def read_orders(connection, after_id: int = 0) -> DataFrame:
+    """
+    Read orders straight into a compact typed DataFrame, without ORM objects
+    :param connection: SQLAlchemy connection
+    :param after_id: Only read orders with a higher id
+    :return: DataFrame with the dataset columns and the derived columns
+    """
+    columns = [Order.__table__.c[column] for column in dataset_columns]
+    stmt = select(*columns).where(Order.id > after_id).order_by(Order.id)
+    df = pd.read_sql_query(
+        stmt, connection, dtype=dataset_dtypes, parse_dates=date_columns
+    )
+
+    # Calculate additional columns
+    days_to_ship = (df["dispatch_date"] - df["order_date"]).dt.days.astype("Int64")
+    df["days_to_ship"] = pd.to_numeric(days_to_ship, downcast="integer")
+    df["profit_ratio"] = df["profit"] / df["sales"]
+    df["quantity"] = pd.to_numeric(df["quantity"], downcast="integer")
+
+    return df.drop(columns="dispatch_date")
+
+
+def append_orders(df: DataFrame, new_rows: DataFrame) -> DataFrame:
+    """
+    Append orders, merging the categories so the columns stay categorical
+    :param df: Dataset
+    :param new_rows: Orders from read_orders
+    :return: New DataFrame, df is left unchanged
+    """
+    df = df.copy(deep=False)
+    new_rows = new_rows.copy(deep=False)
+    for column in category_columns:
+        categories = df[column].cat.categories.union(new_rows[column].cat.categories)
+        df[column] = df[column].cat.set_categories(categories)
+        new_rows[column] = new_rows[column].cat.set_categories(categories)
+
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+def memory_usage(df: DataFrame) -> Tuple[int, float]:
+    """
+    Memory held by a DataFrame, including the strings it references
+    :param df: DataFrame
+    :return: Tuple of (total bytes, bytes per row)
+    """
+    total = int(df.memory_usage(deep=True, index=True).sum())
+    return total, total / len(df) if len(df) else 0.0
+
+
+def sort_by_date(df: DataFrame) -> DataFrame:
+    """
+    Sort orders by order_date, keeping insertion order within a day
+    :param df: DataFrame of orders
+    :return: DataFrame sorted by order_date with missing dates last
+    """
+    if df["order_date"].is_monotonic_increasing:
+        return df
+
+    return df.sort_values("order_date", kind="stable", na_position="last").reset_index(
+        drop=True
+    )
+
+
+def date_range_slice(df: DataFrame, start_date, end_date) -> DataFrame:
+    """
+    Select orders between two dates, inclusive, with a binary search
+    :param df: DataFrame of orders sorted by order_date
+    :param start_date: First order date
+    :param end_date: Last order date
+    :return: Contiguous slice of df (a view, not a copy)
+    """
+    if pd.isna(start_date) or pd.isna(end_date):
+        return df.iloc[0:0]
+
+    dates = df["order_date"].to_numpy()
+    start = dates.searchsorted(pd.Timestamp(start_date).to_datetime64(), "left")
+    end = dates.searchsorted(pd.Timestamp(end_date).to_datetime64(), "right")
+
+    return df.iloc[start:end]
+
+
+def write_snapshot(
+    df: DataFrame,
+    database_id: str,
+    version: int,
+    max_id: int,
+    path: str = snapshot_path,
+):
+    """
+    Write the dataset to an Arrow IPC file, replacing the previous one atomically
+    unless it is already at the same or a newer data version of the database
+    :param df: Dataset sorted by order_date
+    :param database_id: Id of the database the dataset was read from
+    :param version: Data version the dataset was read at
+    :param max_id: Highest order id in the dataset
+    :param path: Snapshot file path
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {
+            **table.schema.metadata,
+            b"database_id": database_id.encode(),
+            b"format": str(snapshot_format).encode(),
+            b"version": str(version).encode(),
+            b"max_id": str(max_id).encode(),
+        }
+    )
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with pa.OSFile(temp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        current_version = snapshot_version(database_id, path)
+        if current_version is not None and current_version >= version:
+            logger.info(
+                f"Keeping dataset snapshot {path}, it is at version {current_version}"
+            )
+            os.remove(temp_path)
+            return
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write dataset snapshot {path}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def snapshot_metadata(database_id: Optional[str], path: str) -> Optional[dict]:
+    """
+    Read the metadata of a snapshot written for a database, in this format
+    :param database_id: Id of the database the dataset is read from
+    :param path: Snapshot file path
+    :return: Arrow schema metadata, None if there is no usable snapshot
+    """
+    if database_id is None or not os.path.exists(path):
+        return None
+
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata or {}
+    if metadata.get(b"database_id", b"").decode() != database_id:
+        return None
+    if metadata.get(b"format") != str(snapshot_format).encode():
+        return None
+    return metadata
+
+
+def snapshot_version(
+    database_id: Optional[str], path: str = snapshot_path
+) -> Optional[int]:
+    """
+    Data version of the snapshot on disk, without reading its rows
+    :param database_id: Id of the database the dataset is read from
+    :param path: Snapshot file path
+    :return: Version, None if there is no usable snapshot of that database
+    """
+    try:
+        metadata = snapshot_metadata(database_id, path)
+        return int(metadata[b"version"]) if metadata else None
+    except (pa.ArrowInvalid, OSError, KeyError, ValueError):
+        return None
+
+
+def read_snapshot(
+    database_id: Optional[str], path: str = snapshot_path
+) -> Optional[Tuple[DataFrame, int, int]]:
+    """
+    Memory-map the dataset snapshot written by write_snapshot
+    :param database_id: Id of the database the dataset is read from
+    :param path: Snapshot file path
+    :return: Tuple of (dataset, version, max_id), None if there is no usable
+        snapshot of that database
+    """
+    try:
+        metadata = snapshot_metadata(database_id, path)
+        if metadata is None:
+            return None
+        with pa.memory_map(path) as source:
+            df = pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+        return df, int(metadata[b"version"]), int(metadata[b"max_id"])
+    except (pa.ArrowInvalid, OSError, KeyError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable dataset snapshot {path}: {e}")
+        return None
+
+
+class OrdersDataset:
+    """
+    Lazily loaded orders DataFrame for the graph page, kept in sync with the
+    database through the data version and sorted by order_date. Starts from
+    the on-disk snapshot when there is one, see save_snapshot
+    """
+
+    def __init__(self, path: str = snapshot_path):
+        # Empty to not use a snapshot
+        self.path = path
+        self._lock = threading.Lock()
+        self._df: Optional[DataFrame] = None
+        self._database_id: Optional[str] = None
+        self._version: Optional[int] = None
+        self._max_id = 0
+
+    def get(self) -> DataFrame:
+        """
+        Get the dataset, loading it or appending new orders if the data changed
+        :return: DataFrame of orders
+        """
+        with read_engine.connect() as connection:
+            database_id = get_database_id(connection)
+            version, base_version = get_data_version(connection)
+            current = (database_id, version) == (self._database_id, self._version)
+            if current and self._df is not None:
+                return self._df
+
+            with self._lock:
+                if self._df is None and self.path:
+                    self._load_snapshot(database_id)
+                current = (database_id, version) == (self._database_id, self._version)
+                if current and self._df is not None:
+                    return self._df
+
+                if (
+                    self._df is None
+                    or database_id != self._database_id
+                    or base_version > self._version
+                    or version < self._version
+                ):
+                    # First use, another database at the same URL, existing
+                    # orders were changed or the database is older than the
+                    # snapshot
+                    new_rows = read_orders(connection)
+                    df = None
+                    self._max_id = 0
+                else:
+                    new_rows = read_orders(connection, after_id=self._max_id)
+                    df = self._df
+
+                # Ids are only needed to know where to append from
+                if len(new_rows):
+                    self._max_id = int(new_rows["id"].iloc[-1])
+                new_rows = new_rows.drop(columns="id")
+
+                if df is None:
+                    df = new_rows
+                    total, per_row = memory_usage(df)
+                    logger.info(
+                        f"Loaded {len(df)} orders, {total / 2**20:.1f} MiB "
+                        f"({per_row:.0f} bytes per row)"
+                    )
+                elif len(new_rows):
+                    df = append_orders(df, new_rows)
+
+                self._df = sort_by_date(df)
+                self._database_id = database_id
+                self._version = version
+
+        return self._df
+
+    def save_snapshot(self):
+        """
+        Catch the dataset up with the database and write it to the snapshot.
+        Called by the process that wrote the orders, so the web workers only
+        ever read the snapshot
+        """
+        self.get()
+        with self._lock:
+            df, database_id = self._df, self._database_id
+            version, max_id = self._version, self._max_id
+        if database_id is None:
+            # Nothing was ever written to the database
+            return
+
+        logger.info(f"Writing dataset snapshot to {self.path}")
+        write_snapshot(df, database_id, version, max_id, self.path)
+
+    def _load_snapshot(self, database_id: Optional[str]):
+        """
+        Start from the snapshot, get() then catches up with the database
+        :param database_id: Id of the database the dataset is read from
+        """
+        snapshot = read_snapshot(database_id, self.path)
+        if snapshot is not None:
+            self._df, self._version, self._max_id = snapshot
+            self._database_id = database_id
+            logger.info(
+                f"Loaded {len(self._df)} orders from {self.path} "
+                f"(version {self._version})"
+            )
+
+    def slice(self, start_date, end_date) -> DataFrame:
+        """
+        Get the orders between two dates, inclusive
+        :param start_date: First order date
+        :param end_date: Last order date
+        :return: Contiguous slice of the dataset
+        """
+        return date_range_slice(self.get(), start_date, end_date)
+
+    def invalidate(self):
+        """
+        Drop the dataset so it is fully reloaded on next use
+        """
+        with self._lock:
+            self._df = None
+            self._database_id = None
+            self._version = None
+
+
+orders_dataset = OrdersDataset()
+
+
+if __name__ == "__main__":
+    if snapshot_path:
+        orders_dataset.save_snapshot()
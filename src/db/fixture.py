@@ -1,77 +1,430 @@
+import argparse
 import os
+import time
+from datetime import datetime
+from typing import Iterator, List, Tuple
 
 import pandas as pd
+import pyarrow.parquet as pq
 from loguru import logger
+from pandas import DataFrame
+from sqlalchemy import delete, func, insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
 
-from src.db.connection import SessionLocal
-from src.db.model import Order
+from src.db import star
+from src.db.connection import STORAGE_LAYOUT, engine, init_db
+from src.db.dataset import orders_dataset, snapshot_path
+from src.db.model import IngestState, Order
+from src.db.rollup import refresh_daily_rollup
 from src.db.schema import OrderData
+from src.db.search import search_columns, sync_search_index
+from src.db.version import bump_data_version
 
+default_chunk_size = 5000
+# Extensions read by read_chunks
+source_formats = (".csv", ".parquet", ".xls", ".xlsx")
 
-def load_data_to_db(file_path: str):
-    # Read Excel file
-    xls = pd.ExcelFile(file_path)
-    df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
+# Source file column names mapped to Order attributes
+column_map = {
+    "Row ID": "id",
+    "Order ID": "order_id",
+    "Order Date": "order_date",
+    "Dispatch Date": "dispatch_date",
+    "Delivery Mode": "delivery_mode",
+    "Customer ID": "customer_id",
+    "Customer Name": "customer_name",
+    "Segment": "segment",
+    "City": "city",
+    "State/Province": "state_province",
+    "Country/Region": "country_region",
+    "Region": "region",
+    "Product ID": "product_id",
+    "Category": "category",
+    "Sub-Category": "sub_category",
+    "Product Name": "product_name",
+    "Sales": "sales",
+    "Quantity": "quantity",
+    "Discount": "discount",
+    "Profit": "profit",
+}
+# Order columns by the type coerce_chunk converts them to
+integer_columns = ["id", "quantity"]
+float_columns = ["sales", "discount", "profit"]
+date_columns = ["order_date", "dispatch_date"]
+string_columns = [
+    column
+    for column in column_map.values()
+    if column not in integer_columns + float_columns + date_columns
+]
 
-    df["Order Date"] = pd.to_datetime(df["Order Date"])
-    df["Dispatch Date"] = pd.to_datetime(df["Dispatch Date"])
-    df = df.sort_values(by="Row ID", ascending=True)
 
-    # Start logging
-    logger.info("Starting data load to database...")
+def source_files(path: str) -> List[str]:
+    """
+    List the source files to ingest
+    :param path: Path to a source file or a directory of them
+    :return: Sorted file paths, so dated delta files load oldest first
+    """
+    if not os.path.isdir(path):
+        return [path]
+
+    return sorted(
+        os.path.join(path, name)
+        for name in os.listdir(path)
+        if os.path.splitext(name)[1].lower() in source_formats
+    )
+
+
+def read_chunks(
+    file_path: str, chunk_size: int, skip_rows: int = 0
+) -> Iterator[DataFrame]:
+    """
+    Stream the source file in chunks of at most chunk_size rows
+    :param file_path: Path to a CSV, Parquet or Excel file
+    :param chunk_size: Number of rows per chunk
+    :param skip_rows: Number of leading data rows to skip
+    :return: Iterator of DataFrames with the source column names
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+
+    if extension == ".csv":
+        yield from pd.read_csv(
+            file_path,
+            usecols=lambda name: name in column_map,
+            skiprows=range(1, skip_rows + 1),
+            # Parse floats exactly, so unchanged rows compare equal on upsert
+            float_precision="round_trip",
+            chunksize=chunk_size,
+        )
+
+    elif extension == ".parquet":
+        parquet_file = pq.ParquetFile(file_path)
+        columns = [
+            name for name in parquet_file.schema_arrow.names if name in column_map
+        ]
+
+        # Skip whole row groups from the footer metadata without reading them
+        row_groups = []
+        for index in range(parquet_file.num_row_groups):
+            num_rows = parquet_file.metadata.row_group(index).num_rows
+            if skip_rows >= num_rows:
+                skip_rows -= num_rows
+            else:
+                row_groups.append(index)
+
+        for batch in parquet_file.iter_batches(
+            batch_size=chunk_size, row_groups=row_groups, columns=columns
+        ):
+            df = batch.to_pandas()
+            if skip_rows:
+                df, skip_rows = df.iloc[skip_rows:], max(skip_rows - len(df), 0)
+            if not df.empty:
+                yield df
+
+    else:
+        # Excel workbooks can't be read incrementally, so slice the sheet instead
+        xls = pd.ExcelFile(file_path)
+        df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
+
+        for start in range(skip_rows, len(df), chunk_size):
+            yield df.iloc[start : start + chunk_size]
+
+
+def coerce_chunk(df: DataFrame) -> DataFrame:
+    """
+    Convert the numbers and dates of a chunk to the Order column types, dropping
+    rows with a value that can't be converted, as OrderData validation would
+    :param df: DataFrame with the Order column names
+    :return: DataFrame of the valid rows
+    """
+    problems = {}
+
+    for column in integer_columns + float_columns:
+        values = pd.to_numeric(df[column], errors="coerce")
+        bad = values.isna() & (df[column].notna() | (column == "id"))
+        if column in integer_columns:
+            bad |= values.notna() & (values % 1 != 0)
+            values = values.where(~bad)
+            values = values.astype("Int64" if values.hasnans else "int64")
+        problems[column] = bad
+        df[column] = values
+
+    for column in date_columns:
+        values = df[column]
+        if pd.api.types.is_datetime64_dtype(values):
+            df[column] = values.dt.date
+            continue
+
+        values = pd.to_datetime(values, errors="coerce")
+        retry = values.isna() & df[column].notna()
+        if retry.any():
+            # Values in another format than the one inferred from the first row
+            values[retry] = pd.to_datetime(
+                df.loc[retry, column], errors="coerce", format="mixed"
+            )
+        problems[column] = values.isna() & df[column].notna()
+        df[column] = values.dt.date
+
+    for column in string_columns:
+        values = df[column]
+        if pd.api.types.infer_dtype(values, skipna=True) not in ("string", "empty"):
+            df[column] = values.where(values.isna(), values.astype(str))
+
+    invalid = pd.concat(problems, axis=1).any(axis=1)
+
+    for index in df.index[invalid]:
+        columns = ", ".join(column for column, bad in problems.items() if bad[index])
+        logger.error(f"Error validating row {df.at[index, 'id']}: invalid {columns}")
+
+    return df[~invalid]
+
+
+def prepare_chunk(df: DataFrame, validate: bool = False) -> List[dict]:
+    """
+    Convert a chunk of source rows to Order column dicts, skipping rows that
+    fail coerce_chunk
+    :param df: DataFrame with the source column names
+    :param validate: Also validate every row with the OrderData schema
+    :return: List of dicts ready for insertion
+    """
+    df = df.rename(columns=column_map)[list(column_map.values())]
+    df = coerce_chunk(df)
+
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+
+    if not validate:
+        return records
 
-    # Validate data and prepare for insertion
     valid_data = []
-    for _, row in df.iterrows():
-        logger.info(f"Processing row: {row['Row ID']}")
+    for record in records:
         try:
-            order = OrderData(
-                id=int(row["Row ID"]),
-                order_id=str(row["Order ID"]),
-                order_date=pd.to_datetime(row["Order Date"]).date(),
-                dispatch_date=pd.to_datetime(row["Dispatch Date"]).date(),
-                delivery_mode=str(row["Delivery Mode"]),
-                customer_id=str(row["Customer ID"]),
-                customer_name=str(row["Customer Name"]),
-                segment=str(row["Segment"]),
-                city=str(row["City"]),
-                state_province=str(row["State/Province"]),
-                country_region=str(row["Country/Region"]),
-                region=str(row["Region"]),
-                product_id=str(row["Product ID"]),
-                category=str(row["Category"]),
-                sub_category=str(row["Sub-Category"]),
-                product_name=str(row["Product Name"]),
-                sales=float(row["Sales"]),
-                quantity=int(row["Quantity"]),
-                discount=float(row["Discount"]),
-                profit=float(row["Profit"]),
-            )
-            valid_data.append(order.dict())
+            valid_data.append(OrderData(**record).model_dump())
+        except Exception as e:
+            logger.error(f"Error validating row {record['id']}: {e}")
+
+    return valid_data
+
+
+def upsert_statement():
+    """
+    INSERT ... ON CONFLICT (id) DO UPDATE statement for the orders table that
+    only updates rows whose values changed, returning the rows it wrote
+    :return: Insert statement for executemany
+    """
+    dialect = sqlite if engine.dialect.name == "sqlite" else postgresql
+    stmt = dialect.insert(Order.__table__)
+    columns = [column for column in Order.__table__.columns if column.key != "id"]
+
+    return stmt.on_conflict_do_update(
+        index_elements=[Order.id],
+        set_={column.key: stmt.excluded[column.key] for column in columns},
+        where=or_(
+            *(column.is_distinct_from(stmt.excluded[column.key]) for column in columns)
+        ),
+    ).returning(Order.id, Order.order_date)
+
+
+def upsert_chunk(connection: Connection, stmt, records: List[dict]) -> int:
+    """
+    Upsert one chunk of orders and update the daily rollup, search index and
+    data version for the rows that were new or changed
+    :param connection: SQLAlchemy connection in a transaction
+    :param stmt: Statement from upsert_statement, unused by the star layout
+    :param records: Order column dicts
+    :return: Number of rows inserted or updated
+    """
+    ids = [record["id"] for record in records]
+    max_id = connection.execute(select(func.max(Order.id))).scalar() or 0
+    # Old versions of the chunk's rows, for the rollup and search index
+    old_rows = {
+        row.id: row
+        for row in connection.execute(
+            select(Order.id, Order.order_date, *search_columns).where(Order.id.in_(ids))
+        )
+    }
+
+    if STORAGE_LAYOUT == "star":
+        written = star.upsert_rows(connection, records)
+    else:
+        written = connection.execute(stmt, records).all()
+    if not written:
+        return 0
+
+    # Re-sum the days the written rows moved to and the days they left
+    dates = {order_date for _, order_date in written}
+    dates.update(
+        old_rows[row_id].order_date for row_id, _ in written if row_id in old_rows
+    )
+    refresh_daily_rollup(connection, dates)
+    sync_search_index(
+        connection,
+        [row_id for row_id, _ in written],
+        [old_rows[row_id] for row_id, _ in written if row_id in old_rows],
+    )
+
+    # Only new rows past the current max id can be appended by cached copies
+    append_only = all(
+        row_id not in old_rows and row_id > max_id for row_id, _ in written
+    )
+    bump_data_version(connection, append_only=append_only)
+
+    return len(written)
+
+
+def save_ingest_state(connection: Connection, state: IngestState):
+    """
+    Record the high-water mark of a source file, call in the same
+    transaction as the chunk it covers
+    :param connection: SQLAlchemy connection in a transaction
+    :param state: Ingest state to insert or replace
+    """
+    state.updated_at = datetime.now()
+    values = {
+        column.key: getattr(state, column.key)
+        for column in IngestState.__table__.columns
+    }
+    connection.execute(delete(IngestState).where(IngestState.source == state.source))
+    connection.execute(insert(IngestState).values(**values))
+
+
+def load_file_to_db(
+    file_path: str, stmt, chunk_size: int, resume: bool, validate: bool
+) -> Tuple[int, int]:
+    """
+    Upsert one source file, committing per chunk together with its high-water mark
+    :param file_path: Path to a CSV, Parquet or Excel file
+    :param stmt: Statement from upsert_statement
+    :param chunk_size: Number of rows upserted per transaction
+    :param resume: Continue after the last committed chunk of an unchanged file
+    :param validate: Also validate every row with the OrderData schema
+    :return: Tuple of (rows read, rows inserted or updated)
+    """
+    source = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+
+    state = None
+    if resume:
+        with engine.connect() as connection:
+            state = connection.execute(
+                select(IngestState).where(IngestState.source == source)
+            ).first()
+
+    if state and (state.size, state.modified) == (stat.st_size, stat.st_mtime):
+        if state.completed:
+            logger.info(f"Skipping {file_path}, unchanged since last ingest")
+            return 0, 0
+        logger.info(f"Resuming {file_path} after row {state.rows}")
+        state = IngestState(**state._asdict())
+    else:
+        state = IngestState(
+            source=source,
+            size=stat.st_size,
+            modified=stat.st_mtime,
+            rows=0,
+            max_row_id=None,
+            completed=False,
+        )
+
+    rows_read = 0
+    rows_written = 0
+    for chunk in read_chunks(file_path, chunk_size, skip_rows=state.rows):
+        records = prepare_chunk(chunk, validate=validate)
+
+        try:
+            with engine.begin() as connection:
+                if records:
+                    rows_written += upsert_chunk(connection, stmt, records)
+                    chunk_max_id = max(record["id"] for record in records)
+                    state.max_row_id = max(state.max_row_id or 0, chunk_max_id)
+                state.rows += len(chunk)
+                save_ingest_state(connection, state)
         except Exception as e:
-            logger.error(f"Error validating row: {e}")
+            logger.error(f"Error upserting {file_path} after row {state.rows}: {e}")
+            raise
 
-    logger.info(f"Data validation complete. {len(valid_data)} rows are valid.")
+        rows_read += len(chunk)
+        logger.info(
+            f"{file_path}: committed {state.rows} rows, "
+            f"{rows_written} new or changed"
+        )
 
-    # Insert data into database
-    session = SessionLocal()
-    try:
-        logger.info("Inserting data into database...")
-        for data in valid_data:
-            logger.info(f"Inserting row: {data['id']}")
-            order = Order(**data)
-            session.add(order)
-        session.commit()
-    except Exception as e:
-        logger.error(f"Error inserting data: {e}")
-        session.rollback()
-    finally:
-        session.close()
+    state.completed = True
+    with engine.begin() as connection:
+        save_ingest_state(connection, state)
 
-    logger.info("Data load to database complete.")
+    return rows_read, rows_written
+
+
+def load_data_to_db(
+    path: str,
+    chunk_size: int = default_chunk_size,
+    resume: bool = True,
+    validate: bool = False,
+):
+    """
+    Upsert source files into the orders table. Only new or changed rows are
+    written, and a high-water mark per file lets a re-run skip files it
+    already ingested and resume a partially ingested one
+    :param path: Path to a CSV, Parquet or Excel file or a directory of them
+    :param chunk_size: Number of rows upserted per transaction
+    :param resume: Use the recorded high-water marks
+    :param validate: Also validate every row with the OrderData schema
+    """
+    logger.info("Starting data load to database...")
+
+    stmt = upsert_statement()
+    started = time.perf_counter()
+    total_read = 0
+    total_written = 0
+
+    for file_path in source_files(path):
+        rows_read, rows_written = load_file_to_db(
+            file_path, stmt, chunk_size, resume, validate
+        )
+        total_read += rows_read
+        total_written += rows_written
+
+    elapsed = time.perf_counter() - started
+    rate = total_read / elapsed if elapsed else 0.0
+    logger.info(
+        f"Data load to database complete. {total_read} rows read, "
+        f"{total_written} new or changed, in {elapsed:.2f}s ({rate:,.0f} rows/s)"
+    )
+
+    if total_written and snapshot_path:
+        # Catch the dataset snapshot up, so the dashboard starts from it
+        orders_dataset.save_snapshot()
 
 
 if __name__ == "__main__":
     path = os.path.dirname(os.path.abspath(__file__))
     data_file_path = os.path.join(path, "data", "(GB) Sample - EU Superstore.xls")
-    load_data_to_db(data_file_path)
+
+    parser = argparse.ArgumentParser(description="Load orders into the database")
+    parser.add_argument(
+        "path",
+        nargs="?",
+        default=data_file_path,
+        help="CSV, Parquet or Excel file, or a directory of them",
+    )
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size)
+    parser.add_argument(
+        "--no-resume",
+        dest="resume",
+        action="store_false",
+        help="Re-read every file instead of using the recorded high-water marks",
+    )
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Also validate every row with the OrderData schema (slower)",
+    )
+    args = parser.parse_args()
+
+    init_db()
+    load_data_to_db(
+        args.path,
+        chunk_size=args.chunk_size,
+        resume=args.resume,
+        validate=args.validate,
+    )
@@ -0,0 +1,327 @@
+import argparse
+import os
+import time
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from loguru import logger
+from pandas import DataFrame
+from sqlalchemy import func, select
+
+from src.db.connection import engine, init_db
+from src.db.dataset import orders_dataset, snapshot_path
+from src.db.fixture import (
+    column_map,
+    default_chunk_size,
+    prepare_chunk,
+    upsert_chunk,
+    upsert_statement,
+)
+from src.db.model import Order
+
+path = os.path.dirname(os.path.abspath(__file__))
+sample_file_path = os.path.join(path, "data", "(GB) Sample - EU Superstore.xls")
+
+# Columns that belong to the order rather than to one of its lines
+header_columns = [
+    "Order Date",
+    "Delivery Mode",
+    "Customer ID",
+    "Customer Name",
+    "Segment",
+    "City",
+    "State/Province",
+    "Country/Region",
+    "Region",
+]
+product_columns = ["Product ID", "Category", "Sub-Category", "Product Name"]
+
+# Generated order numbers start above the sample's, so Order IDs never collide
+first_order_number = 10_000_000
+
+
+def empirical(values: pd.Series):
+    """
+    Distinct values of a column and how often they occur
+    :param values: Column of the sample
+    :return: Tuple of (values array, probabilities array)
+    """
+    counts = values.value_counts()
+    return counts.index.to_numpy(), (counts / counts.sum()).to_numpy()
+
+
+class SuperstoreModel:
+    """
+    Column distributions and hierarchies learned from the sample workbook,
+    used to generate any number of realistic synthetic orders
+    """
+
+    def __init__(self, sample: DataFrame):
+        """
+        Learn the distributions of the sample
+        :param sample: DataFrame with the source column names
+        """
+        sample = sample.dropna(subset=["Row ID", "Order ID"])
+        orders = sample.drop_duplicates("Order ID")
+
+        # Whole order headers keep customers, places, dates and modes consistent
+        self.headers = orders[header_columns].reset_index(drop=True)
+        self.prefixes = orders["Order ID"].str.split("-").str[0].to_numpy()
+        self.ship_days = (orders["Dispatch Date"] - orders["Order Date"]).dt.days
+        self.ship_days = self.ship_days.fillna(0).astype("int64").to_numpy()
+        self.lines_per_order = empirical(sample.groupby("Order ID").size())
+
+        # Products with their list price before discount
+        list_price = sample["Sales"] / (
+            sample["Quantity"] * (1 - sample["Discount"])
+        ).replace(0, np.nan)
+        products = sample[product_columns].assign(list_price=list_price)
+        products = products.groupby("Product ID", sort=False).agg(
+            {
+                "Category": "first",
+                "Sub-Category": "first",
+                "Product Name": "first",
+                "list_price": "median",
+                "Product ID": "size",
+            }
+        )
+        products = products.rename(columns={"Product ID": "weight"}).reset_index()
+        self.products = products.drop(columns="weight")
+        self.product_weights = (
+            products["weight"] / products["weight"].sum()
+        ).to_numpy()
+
+        self.quantities = empirical(sample["Quantity"])
+
+        # Discounts depend on the market and the product line, margins on the
+        # product line and the discount. Combinations the sample lacks fall
+        # back to the market or the discount alone
+        self.discounts = {
+            key: empirical(group["Discount"])
+            for key, group in sample.groupby(["Country/Region", "Sub-Category"])
+        }
+        self.country_discounts = {
+            country: empirical(group["Discount"])
+            for country, group in sample.groupby("Country/Region")
+        }
+        margin = (sample["Profit"] / sample["Sales"].replace(0, np.nan)).fillna(0)
+        self.margins = {
+            key: group.to_numpy()
+            for key, group in margin.groupby(
+                [sample["Sub-Category"], sample["Discount"]]
+            )
+        }
+        self.discount_margins = {
+            discount: group.to_numpy()
+            for discount, group in margin.groupby(sample["Discount"])
+        }
+
+    @classmethod
+    def from_file(cls, file_path: str = sample_file_path) -> "SuperstoreModel":
+        """
+        Learn the distributions of a sample file
+        :param file_path: Path to the Excel sample
+        :return: SuperstoreModel
+        """
+        xls = pd.ExcelFile(file_path)
+        return cls(pd.read_excel(xls, sheet_name=xls.sheet_names[0]))
+
+    def generate(
+        self,
+        rows: int,
+        start_id: int = 1,
+        chunk_size: int = default_chunk_size,
+        seed: Optional[int] = None,
+    ) -> Iterator[DataFrame]:
+        """
+        Generate synthetic orders in chunks
+        :param rows: Number of order lines
+        :param start_id: Row ID of the first line
+        :param chunk_size: Number of lines per chunk
+        :param seed: Random seed, for reproducible datasets
+        :return: Iterator of DataFrames with the source column names
+        """
+        rng = np.random.default_rng(seed)
+        order_number = first_order_number + start_id
+
+        for start in range(0, rows, chunk_size):
+            size = min(chunk_size, rows - start)
+            chunk = self._generate_chunk(rng, size, order_number)
+            chunk.insert(
+                0, "Row ID", np.arange(start_id + start, start_id + start + size)
+            )
+            order_number += chunk.attrs["orders"]
+            yield chunk
+
+    def _generate_chunk(
+        self, rng: np.random.Generator, size: int, order_number: int
+    ) -> DataFrame:
+        """
+        Generate one chunk of order lines, every column drawn vectorized
+        :param rng: Random generator
+        :param size: Number of lines
+        :param order_number: Number of the chunk's first order
+        :return: DataFrame with the source column names except Row ID
+        """
+        # Draw enough orders to cover the chunk, then cut the last one short
+        values, probabilities = self.lines_per_order
+        lines = rng.choice(values, size=size, p=probabilities)
+        lines = lines[: np.searchsorted(np.cumsum(lines), size) + 1]
+        order_count = len(lines)
+        order_of_line = np.repeat(np.arange(order_count), lines)[:size]
+
+        header_index = rng.integers(0, len(self.headers), order_count)
+        ship_days = self.ship_days[header_index]
+        headers = self.headers.iloc[header_index[order_of_line]].reset_index(drop=True)
+
+        years = self.headers["Order Date"].dt.year.to_numpy()[header_index]
+        order_ids = (
+            pd.Series(self.prefixes[header_index])
+            + "-"
+            + pd.Series(years).astype(str)
+            + "-"
+            + pd.Series(np.arange(order_number, order_number + order_count)).astype(str)
+        ).to_numpy()
+
+        product_index = rng.choice(
+            len(self.products), size=size, p=self.product_weights
+        )
+        products = self.products.iloc[product_index].reset_index(drop=True)
+
+        values, probabilities = self.quantities
+        quantity = rng.choice(values, size=size, p=probabilities)
+
+        discount = np.zeros(size)
+        groups = pd.Series(index=[headers["Country/Region"], products["Sub-Category"]])
+        for key, index in groups.groupby(level=[0, 1]).indices.items():
+            values, probabilities = self.discounts.get(
+                key, self.country_discounts[key[0]]
+            )
+            discount[index] = rng.choice(values, size=len(index), p=probabilities)
+
+        margin = np.zeros(size)
+        groups = pd.Series(index=[products["Sub-Category"], discount])
+        for key, index in groups.groupby(level=[0, 1]).indices.items():
+            margins = self.margins.get(key, self.discount_margins[key[1]])
+            margin[index] = margins[rng.integers(0, len(margins), len(index))]
+
+        # Prices vary a little around the product's list price
+        list_price = products["list_price"].to_numpy() * rng.normal(1.0, 0.05, size)
+        sales = np.round(list_price * quantity * (1 - discount), 2)
+        profit = np.round(sales * margin, 2)
+
+        df = DataFrame(
+            {
+                "Order ID": order_ids[order_of_line],
+                "Order Date": headers["Order Date"],
+                "Dispatch Date": headers["Order Date"]
+                + pd.to_timedelta(ship_days[order_of_line], unit="D"),
+                **{
+                    column: headers[column]
+                    for column in header_columns
+                    if column != "Order Date"
+                },
+                **{column: products[column] for column in product_columns},
+                "Sales": sales,
+                "Quantity": quantity,
+                "Discount": discount,
+                "Profit": profit,
+            }
+        )
+        df = df[list(column_map)[1:]]
+        df.attrs["orders"] = order_count
+
+        return df
+
+
+def generate_to_parquet(
+    model: SuperstoreModel,
+    rows: int,
+    file_path: str,
+    chunk_size: int = default_chunk_size,
+    seed: Optional[int] = None,
+):
+    """
+    Stream synthetic orders into a Parquet file, one row group per chunk
+    :param model: SuperstoreModel
+    :param rows: Number of order lines
+    :param file_path: Path to the Parquet file
+    :param chunk_size: Number of lines per row group
+    :param seed: Random seed
+    """
+    writer = None
+    try:
+        for chunk in model.generate(rows, chunk_size=chunk_size, seed=seed):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(file_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def generate_to_db(
+    model: SuperstoreModel,
+    rows: int,
+    chunk_size: int = default_chunk_size,
+    seed: Optional[int] = None,
+):
+    """
+    Stream synthetic orders into the orders table after the existing ones,
+    committing per chunk
+    :param model: SuperstoreModel
+    :param rows: Number of order lines
+    :param chunk_size: Number of lines per transaction
+    :param seed: Random seed
+    """
+    with engine.connect() as connection:
+        start_id = (connection.execute(select(func.max(Order.id))).scalar() or 0) + 1
+
+    stmt = upsert_statement()
+    for chunk in model.generate(rows, start_id, chunk_size, seed):
+        records = prepare_chunk(chunk)
+        with engine.begin() as connection:
+            upsert_chunk(connection, stmt, records)
+        logger.info(f"Committed Row ID {records[-1]['id']}")
+
+    if snapshot_path:
+        orders_dataset.save_snapshot()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic orders")
+    parser.add_argument("rows", type=int, help="Number of order lines")
+    parser.add_argument(
+        "--output",
+        help="Write a Parquet file instead of inserting into the database",
+    )
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--sample",
+        default=sample_file_path,
+        help="Excel file the distributions are learned from",
+    )
+    args = parser.parse_args()
+
+    logger.info(f"Learning distributions from {args.sample}")
+    superstore_model = SuperstoreModel.from_file(args.sample)
+
+    started = time.perf_counter()
+    if args.output:
+        generate_to_parquet(
+            superstore_model, args.rows, args.output, args.chunk_size, args.seed
+        )
+    else:
+        init_db()
+        generate_to_db(superstore_model, args.rows, args.chunk_size, args.seed)
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Generated {args.rows} orders in {elapsed:.2f}s "
+        f"({args.rows / elapsed:,.0f} rows/s)"
+    )
@@ -0,0 +1,110 @@
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from src.db.model import Order
+from src.db.version import get_data_version
+
+
+def to_options(values) -> List[dict]:
+    """
+    Convert values to sorted dropdown options
+    :param values: Iterable of option values
+    :return: List of label/value dicts
+    """
+    return [{"label": value, "value": value} for value in sorted(values)]
+
+
+class HierarchyIndex:
+    """
+    In-memory country → state → city and category → sub-category lookup
+    for the cascading dropdowns, built from SELECT DISTINCT on first use and
+    rebuilt when the data version changes
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        # (countries, states, cities, categories, sub-categories), replaced as
+        # a whole so options() never mixes two builds
+        self._options: Tuple[
+            List[dict],
+            Dict[str, List[dict]],
+            Dict[Tuple[str, str], List[dict]],
+            List[dict],
+            Dict[str, List[dict]],
+        ] = ([], {}, {}, [], {})
+
+    def build(self, session: Session, version: Optional[int] = None):
+        """
+        Load the distinct hierarchies from the database
+        :param session: SQLAlchemy session object
+        :param version: Data version the hierarchies are loaded at
+        """
+        geography = (
+            session.query(Order.country_region, Order.state_province, Order.city)
+            .distinct()
+            .all()
+        )
+        categories = session.query(Order.category, Order.sub_category).distinct().all()
+
+        states = defaultdict(set)
+        cities = defaultdict(set)
+        for country, state, city in geography:
+            if country is None:
+                continue
+            if state is not None:
+                states[country].add(state)
+                if city is not None:
+                    cities[(country, state)].add(city)
+
+        sub_categories = defaultdict(set)
+        for category, sub_category in categories:
+            if category is not None and sub_category is not None:
+                sub_categories[category].add(sub_category)
+
+        self._options = (
+            to_options({country for country, _, _ in geography if country is not None}),
+            {key: to_options(value) for key, value in states.items()},
+            {key: to_options(value) for key, value in cities.items()},
+            to_options(
+                {category for category, _ in categories if category is not None}
+            ),
+            {key: to_options(value) for key, value in sub_categories.items()},
+        )
+        self._version = version
+
+    def options(
+        self,
+        session: Session,
+        country: Optional[str],
+        state: Optional[str],
+        category: Optional[str],
+    ) -> Tuple[List[dict], List[dict], List[dict], List[dict], List[dict]]:
+        """
+        Dropdown options for the current selection
+        :param session: SQLAlchemy session object, used if the index must be built
+        :param country: Selected country/region
+        :param state: Selected state/province
+        :param category: Selected category
+        :return: Country, state, city, category and sub-category options
+        """
+        version = get_data_version(session)[0]
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self.build(session, version)
+
+        countries, states, cities, categories, sub_categories = self._options
+        return (
+            countries,
+            states.get(country, []) if country else [],
+            cities.get((country, state), []) if country and state else [],
+            categories,
+            sub_categories.get(category, []) if category else [],
+        )
+
+
+hierarchy_index = HierarchyIndex()
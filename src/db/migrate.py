@@ -0,0 +1,58 @@
+from loguru import logger
+from sqlalchemy import inspect, select, text
+from sqlalchemy.engine import Engine
+
+from src.db.connection import engine, init_db
+from src.db.model import Base, Order, OrderDaily, StarBase
+from src.db.rollup import refresh_daily_rollup
+
+
+def create_missing_indexes(bind: Engine = engine):
+    """
+    Create indexes declared on the models that don't exist in the database yet
+    :param bind: SQLAlchemy engine
+    """
+    inspector = inspect(bind)
+    tables = set(inspector.get_table_names())
+    created = []
+
+    with bind.begin() as connection:
+        for table in Base.metadata.sorted_tables + StarBase.metadata.sorted_tables:
+            # Skips the orders view of the star layout too
+            if table.name not in tables:
+                continue
+
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing:
+                    continue
+
+                logger.info(f"Creating index {index.name} on {table.name}...")
+                index.create(connection)
+                created.append(index.name)
+
+        # Refresh planner statistics so the new indexes get picked up
+        if created and bind.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+
+    logger.info(f"Migration complete. {len(created)} indexes created.")
+
+
+def backfill_daily_rollup(bind: Engine = engine):
+    """
+    Build the daily rollup for a database that has orders but no rollup yet
+    :param bind: SQLAlchemy engine
+    """
+    with bind.begin() as connection:
+        has_orders = connection.execute(select(Order.id).limit(1)).first()
+        has_rollup = connection.execute(select(OrderDaily.order_date).limit(1)).first()
+
+        if has_orders and not has_rollup:
+            logger.info("Building daily rollup...")
+            refresh_daily_rollup(connection)
+
+
+if __name__ == "__main__":
+    init_db()
+    create_missing_indexes()
+    backfill_daily_rollup()
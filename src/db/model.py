@@ -1,4 +1,14 @@
-from sqlalchemy import Column, Date, Float, Integer, String
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -6,6 +16,23 @@ Base = declarative_base()
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Cascading filters on the table page
+        Index("ix_orders_geography", "country_region", "state_province", "city"),
+        Index("ix_orders_category", "category", "sub_category"),
+        # Date range scans on the graph page, covering the summed columns
+        Index(
+            "ix_orders_order_date",
+            "order_date",
+            "dispatch_date",
+            "sales",
+            "profit",
+            "quantity",
+            "discount",
+        ),
+        # Duplicate check when adding a record
+        Index("ix_orders_order_id", "order_id"),
+    )
 
     id = Column(Integer, primary_key=True)
     order_id = Column(String, nullable=True)
@@ -27,3 +54,137 @@ class Order(Base):
     quantity = Column(Integer, nullable=True)
     discount = Column(Float, nullable=True)
     profit = Column(Float, nullable=True)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    # Bumped by every write to the orders table
+    version = Column(Integer, nullable=False, default=0)
+    # Version of the last write that changed or removed existing orders
+    base_version = Column(Integer, nullable=False, default=0)
+
+
+class DatabaseIdentity(Base):
+    __tablename__ = "database_identity"
+
+    id = Column(Integer, primary_key=True)
+    # Random id given to the database on first use, so caches and snapshots
+    # made from another database at the same URL, e.g. a recreated one, whose
+    # data versions restart from 1, are not taken for this one's
+    database_id = Column(String, nullable=False)
+
+
+class OrderDaily(Base):
+    __tablename__ = "orders_daily"
+
+    # Orders summed per order_date, see src/db/rollup.py
+    order_date = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    sales = Column(Float, nullable=True)
+    profit = Column(Float, nullable=True)
+    quantity = Column(Integer, nullable=True)
+    discount = Column(Float, nullable=True)
+    days_to_ship = Column(Integer, nullable=True)
+    profit_ratio = Column(Float, nullable=True)
+
+
+class IngestState(Base):
+    __tablename__ = "ingest_state"
+
+    # High-water mark of each ingested source file, see src/db/fixture.py
+    source = Column(String, primary_key=True)
+    # Fingerprint of the file when it was read, a changed file is re-read
+    size = Column(Integer, nullable=False)
+    modified = Column(Float, nullable=False)
+    # Source rows committed so far and the highest Row ID among them
+    rows = Column(Integer, nullable=False, default=0)
+    max_row_id = Column(Integer, nullable=True)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, nullable=True)
+
+
+# Normalized storage layout, see src/db/star.py. Created instead of the orders
+# table when STORAGE_LAYOUT=star, orders is then a view joining these tables
+StarBase = declarative_base()
+
+
+class Customer(StarBase):
+    __tablename__ = "customers"
+    __table_args__ = (
+        Index("ix_customers_lookup", "customer_id", "customer_name", "segment"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    customer_id = Column(String, nullable=True)
+    customer_name = Column(String, nullable=True)
+    segment = Column(String, nullable=True)
+
+
+class Geography(StarBase):
+    __tablename__ = "geographies"
+    __table_args__ = (
+        # Lookup on insert and the cascading filters on the table page
+        Index(
+            "ix_geographies_lookup",
+            "country_region",
+            "state_province",
+            "city",
+            "region",
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    city = Column(String, nullable=True)
+    state_province = Column(String, nullable=True)
+    country_region = Column(String, nullable=True)
+    region = Column(String, nullable=True)
+
+
+class Product(StarBase):
+    __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_lookup", "product_id", "product_name"),
+        Index("ix_products_category", "category", "sub_category"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(String, nullable=True)
+    category = Column(String, nullable=True)
+    sub_category = Column(String, nullable=True)
+    product_name = Column(String, nullable=True)
+
+
+class OrderLine(StarBase):
+    __tablename__ = "order_lines"
+    __table_args__ = (
+        # Date range scans on the graph page, covering the summed columns
+        Index(
+            "ix_order_lines_order_date",
+            "order_date",
+            "dispatch_date",
+            "sales",
+            "profit",
+            "quantity",
+            "discount",
+        ),
+        Index("ix_order_lines_order_id", "order_id"),
+        Index("ix_order_lines_customer_key", "customer_key"),
+        Index("ix_order_lines_geography_key", "geography_key"),
+        Index("ix_order_lines_product_key", "product_key"),
+    )
+
+    # Same id as Order.id (Row ID)
+    id = Column(Integer, primary_key=True)
+    order_id = Column(String, nullable=True)
+    order_date = Column(Date, nullable=True)
+    dispatch_date = Column(Date, nullable=True)
+    delivery_mode = Column(String, nullable=True)
+    customer_key = Column(Integer, ForeignKey("customers.id"), nullable=True)
+    geography_key = Column(Integer, ForeignKey("geographies.id"), nullable=True)
+    product_key = Column(Integer, ForeignKey("products.id"), nullable=True)
+    sales = Column(Float, nullable=True)
+    quantity = Column(Integer, nullable=True)
+    discount = Column(Float, nullable=True)
+    profit = Column(Float, nullable=True)
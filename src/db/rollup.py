@@ -0,0 +1,120 @@
+from datetime import date
+from typing import Iterable, Optional, Union
+
+import pandas as pd
+from pandas import DataFrame
+from sqlalchemy import Float, delete, func, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+from src.db.model import Order, OrderDaily
+
+# Measures summed per day, in the order of the orders_daily columns
+rollup_columns = [
+    "orders",
+    "sales",
+    "profit",
+    "quantity",
+    "discount",
+    "days_to_ship",
+    "profit_ratio",
+]
+
+
+class days_between(FunctionElement):
+    """
+    Days from the first date to the second, days_between(start, end)
+    """
+
+    type = Float()
+    inherit_cache = True
+
+
+@compiles(days_between)
+def compile_days_between(element, compiler, **kw):
+    # Subtracting dates gives the number of days on PostgreSQL
+    start, end = element.clauses
+    return f"({compiler.process(end, **kw)} - {compiler.process(start, **kw)})"
+
+
+@compiles(days_between, "sqlite")
+def compile_days_between_sqlite(element, compiler, **kw):
+    start, end = element.clauses
+    return (
+        f"(julianday({compiler.process(end, **kw)}) "
+        f"- julianday({compiler.process(start, **kw)}))"
+    )
+
+
+@compiles(days_between, "mysql")
+def compile_days_between_mysql(element, compiler, **kw):
+    start, end = element.clauses
+    return f"DATEDIFF({compiler.process(end, **kw)}, {compiler.process(start, **kw)})"
+
+
+def daily_rollup_select(dates: Optional[Iterable[date]] = None):
+    """
+    SELECT summing orders per order_date
+    :param dates: Only roll up these order dates
+    :return: SQLAlchemy select
+    """
+    stmt = select(
+        Order.order_date,
+        func.count(Order.id),
+        func.sum(Order.sales),
+        func.sum(Order.profit),
+        func.sum(Order.quantity),
+        func.sum(Order.discount),
+        func.sum(days_between(Order.order_date, Order.dispatch_date)),
+        func.sum(Order.profit / func.nullif(Order.sales, 0)),
+    ).where(Order.order_date.is_not(None))
+
+    if dates is not None:
+        stmt = stmt.where(Order.order_date.in_(list(dates)))
+
+    return stmt.group_by(Order.order_date)
+
+
+def refresh_daily_rollup(
+    bind: Union[Session, Connection], dates: Optional[Iterable[date]] = None
+):
+    """
+    Recompute the daily rollup, call in the same transaction as the write
+    :param bind: SQLAlchemy session or connection
+    :param dates: Order dates touched by the write, all dates if None
+    """
+    if dates is not None:
+        dates = {order_date for order_date in dates if order_date is not None}
+        if not dates:
+            return
+
+    stmt = delete(OrderDaily)
+    if dates is not None:
+        stmt = stmt.where(OrderDaily.order_date.in_(dates))
+    bind.execute(stmt)
+
+    bind.execute(
+        insert(OrderDaily).from_select(
+            ["order_date"] + rollup_columns, daily_rollup_select(dates)
+        )
+    )
+
+
+def read_daily_rollup(connection: Connection, start_date, end_date) -> DataFrame:
+    """
+    Read the daily rollup between two dates, inclusive
+    :param connection: SQLAlchemy connection
+    :param start_date: First order date
+    :param end_date: Last order date
+    :return: DataFrame indexed by order_date
+    """
+    stmt = (
+        select(OrderDaily)
+        .where(OrderDaily.order_date.between(start_date, end_date))
+        .order_by(OrderDaily.order_date)
+    )
+    df = pd.read_sql_query(stmt, connection, parse_dates=["order_date"])
+
+    return df.set_index("order_date")
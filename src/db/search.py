@@ -0,0 +1,180 @@
+"""
+Full-text search over product, customer and city names. On SQLite an FTS5
+table, orders_fts, indexes them with the order id as rowid. It is an external
+content table over orders, so the text isn't stored twice, and every write to
+orders has to update it with sync_search_index. Other databases fall back to
+substring matching.
+
+Rebuild the index after writing to orders outside the app with
+
+    $ python -m src.db.search
+"""
+
+import re
+from typing import Iterable, Optional, Union
+
+from loguru import logger
+from sqlalchemy import column, insert, literal_column, or_, select, table, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Query, Session
+
+from src.db.model import Order
+
+# Indexed Order columns
+search_columns = (Order.product_name, Order.customer_name, Order.city)
+
+orders_fts = table(
+    "orders_fts",
+    column("orders_fts"),
+    column("rowid"),
+    column("rank"),
+    *(column(search_column.key) for search_column in search_columns),
+)
+
+# Words of a search box entry
+search_word_regex = re.compile(r"\w+")
+
+
+def search_enabled(bind: Union[Session, Connection]) -> bool:
+    """
+    Check whether the database has the FTS5 index
+    :param bind: SQLAlchemy session or connection
+    :return: True on SQLite
+    """
+    dialect = bind.get_bind().dialect if isinstance(bind, Session) else bind.dialect
+    return dialect.name == "sqlite"
+
+
+def create_search_index(connection: Connection):
+    """
+    Create the FTS5 table if missing, indexing the existing orders
+    :param connection: SQLAlchemy connection in a transaction, SQLite only
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'orders_fts'")
+    ).first()
+    if exists:
+        return
+
+    logger.info("Building the orders_fts search index...")
+    columns = ", ".join(search_column.key for search_column in search_columns)
+    connection.execute(
+        text(
+            f"CREATE VIRTUAL TABLE orders_fts USING fts5({columns}, "
+            "content = 'orders', content_rowid = 'id', "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    )
+    rebuild_search_index(connection)
+
+
+def rebuild_search_index(bind: Union[Session, Connection]):
+    """
+    Re-index every order from the orders table
+    :param bind: SQLAlchemy session or connection in a transaction
+    """
+    bind.execute(insert(orders_fts).values(orders_fts="rebuild"))
+    bind.execute(insert(orders_fts).values(orders_fts="optimize"))
+
+
+def sync_search_index(
+    bind: Union[Session, Connection], ids: Iterable[int], old_rows: Iterable = ()
+):
+    """
+    Re-index written orders, call in the same transaction as the write
+    :param bind: SQLAlchemy session or connection
+    :param ids: Ids of the orders inserted or updated
+    :param old_rows: Rows with id and the search columns of the updated orders,
+        as they were before the write. External content entries can only be
+        removed with the values they were indexed with
+    """
+    ids = list(ids)
+    if not ids or not search_enabled(bind):
+        return
+
+    old_values = [
+        {
+            "orders_fts": "delete",
+            "rowid": row.id,
+            **{
+                search_column.key: getattr(row, search_column.key)
+                for search_column in search_columns
+            },
+        }
+        for row in old_rows
+    ]
+    if old_values:
+        bind.execute(insert(orders_fts), old_values)
+
+    bind.execute(
+        insert(orders_fts).from_select(
+            ["rowid", *(search_column.key for search_column in search_columns)],
+            select(Order.id, *search_columns).where(Order.id.in_(ids)),
+        )
+    )
+
+
+def match_expression(search: Optional[str]) -> Optional[str]:
+    """
+    Turn a search box entry into an FTS5 query: every word must match the
+    start of a word, so "wils bind" finds "Wilson Jones Binder"
+    :param search: Text typed by the user
+    :return: FTS5 MATCH expression, None if there are no words
+    """
+    words = search_word_regex.findall(search or "")
+    if not words:
+        return None
+
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_orders(query: Query, search: Optional[str]) -> Query:
+    """
+    Restrict an Order query to the orders matching a search
+    :param query: SQLAlchemy query over Order
+    :param search: Text typed by the user
+    :return: Filtered query, joined to orders_fts on SQLite so it can be
+        ordered by search_rank
+    """
+    expression = match_expression(search)
+    if expression is None:
+        return query
+
+    if not search_enabled(query.session):
+        return query.filter(
+            *(
+                or_(
+                    *(
+                        search_column.icontains(word, autoescape=True)
+                        for search_column in search_columns
+                    )
+                )
+                for word in search_word_regex.findall(search)
+            )
+        )
+
+    return query.join(orders_fts, orders_fts.c.rowid == Order.id).filter(
+        literal_column("orders_fts").match(expression)
+    )
+
+
+def search_rank(query: Query, search: Optional[str]) -> list:
+    """
+    ORDER BY clauses ranking search results, best match first
+    :param query: Query returned by search_orders
+    :param search: Text typed by the user
+    :return: List of order by clauses, empty without a search
+    """
+    if match_expression(search) is None or not search_enabled(query.session):
+        return []
+
+    return [orders_fts.c.rank]
+
+
+if __name__ == "__main__":
+    from src.db.connection import engine, init_db
+
+    init_db()
+    with engine.begin() as connection:
+        logger.info("Rebuilding the orders_fts search index...")
+        rebuild_search_index(connection)
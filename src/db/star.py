@@ -0,0 +1,282 @@
+"""
+Star-schema storage layout: customers, geographies and products dimension
+tables around an order_lines fact table, behind an orders view with the wide
+table's columns. The view's INSTEAD OF triggers look up or add the dimension
+rows, so the ORM, page queries and ingest keep using Order unchanged.
+SQLite only, enabled with STORAGE_LAYOUT=star.
+
+Convert an existing wide database with
+
+    $ python -m src.db.star
+"""
+
+from typing import List, Tuple
+
+from loguru import logger
+from sqlalchemy import (
+    Column,
+    MetaData,
+    Table,
+    delete,
+    insert,
+    inspect,
+    or_,
+    select,
+    text,
+)
+from sqlalchemy.engine import Connection, Engine
+
+from src.db.model import Order, StarBase
+
+# Dimension table: (fact table key, natural columns identifying a row)
+dimensions = {
+    "customers": ("customer_key", ["customer_id", "customer_name", "segment"]),
+    "geographies": (
+        "geography_key",
+        ["city", "state_province", "country_region", "region"],
+    ),
+    "products": (
+        "product_key",
+        ["product_id", "category", "sub_category", "product_name"],
+    ),
+}
+# Columns kept on the fact table
+fact_columns = [
+    "id",
+    "order_id",
+    "order_date",
+    "dispatch_date",
+    "delivery_mode",
+    "sales",
+    "quantity",
+    "discount",
+    "profit",
+]
+
+# Per-connection table an ingest chunk is loaded into before it is diffed
+staging = Table(
+    "orders_staging",
+    MetaData(),
+    *(Column(column.name, column.type) for column in Order.__table__.columns),
+    prefixes=["TEMPORARY"],
+)
+
+
+def view_ddl() -> str:
+    """
+    CREATE VIEW statement joining the fact and dimension tables into the
+    orders table's columns. LEFT JOINs on primary keys let SQLite drop the
+    dimensions a plain select doesn't use, aggregates probe them by rowid
+    :return: SQL
+    """
+    dimension_columns = {
+        column: table
+        for table, (_, columns) in dimensions.items()
+        for column in columns
+    }
+    columns = ", ".join(
+        f"{dimension_columns.get(column.name, 'order_lines')}.{column.name}"
+        for column in Order.__table__.columns
+    )
+    joins = " ".join(
+        f"LEFT JOIN {table} ON {table}.id = order_lines.{key}"
+        for table, (key, _) in dimensions.items()
+    )
+    return (
+        f"CREATE VIEW IF NOT EXISTS orders AS SELECT {columns} FROM order_lines {joins}"
+    )
+
+
+def dimension_match(table: str, columns: List[str], row: str) -> str:
+    """
+    Condition finding a row's dimension entry, IS so NULLs match each other
+    :param table: Dimension table
+    :param columns: Natural columns of the dimension
+    :param row: Source of the values, e.g. NEW or a table alias
+    :return: SQL condition
+    """
+    return " AND ".join(f"{table}.{column} IS {row}.{column}" for column in columns)
+
+
+def dimension_inserts() -> str:
+    """
+    Trigger statements adding NEW's dimension rows that don't exist yet
+    :return: SQL statements
+    """
+    return "".join(
+        f"INSERT INTO {table} ({', '.join(columns)}) "
+        f"SELECT {', '.join(f'NEW.{column}' for column in columns)} "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table} "
+        f"WHERE {dimension_match(table, columns, 'NEW')}); "
+        for table, (_, columns) in dimensions.items()
+    )
+
+
+def dimension_keys() -> dict:
+    """
+    Subqueries looking up NEW's dimension keys
+    :return: Dict of fact table key column to SQL expression
+    """
+    return {
+        key: f"(SELECT id FROM {table} "
+        f"WHERE {dimension_match(table, columns, 'NEW')})"
+        for table, (key, columns) in dimensions.items()
+    }
+
+
+def trigger_ddl() -> List[str]:
+    """
+    INSTEAD OF triggers making the orders view writable
+    :return: SQL statements
+    """
+    values = {column: f"NEW.{column}" for column in fact_columns}
+    values.update(dimension_keys())
+
+    return [
+        "CREATE TRIGGER IF NOT EXISTS orders_insert INSTEAD OF INSERT ON orders "
+        f"BEGIN {dimension_inserts()}"
+        f"INSERT INTO order_lines ({', '.join(values)}) "
+        f"VALUES ({', '.join(values.values())}); END",
+        "CREATE TRIGGER IF NOT EXISTS orders_update INSTEAD OF UPDATE ON orders "
+        f"BEGIN {dimension_inserts()}"
+        "UPDATE order_lines SET "
+        f"{', '.join(f'{column} = {value}' for column, value in values.items())} "
+        "WHERE id = OLD.id; END",
+        "CREATE TRIGGER IF NOT EXISTS orders_delete INSTEAD OF DELETE ON orders "
+        "BEGIN DELETE FROM order_lines WHERE id = OLD.id; END",
+    ]
+
+
+def has_wide_orders(bind) -> bool:
+    """
+    Check whether the database holds the wide orders table
+    :param bind: SQLAlchemy engine or connection
+    :return: True if orders is a table rather than the star view
+    """
+    return "orders" in inspect(bind).get_table_names()
+
+
+def create_star_schema(connection: Connection):
+    """
+    Create the star tables, the orders view and its triggers if missing
+    :param connection: SQLAlchemy connection in a transaction
+    """
+    StarBase.metadata.create_all(connection)
+    connection.execute(text(view_ddl()))
+    for ddl in trigger_ddl():
+        connection.execute(text(ddl))
+
+
+def init_star_schema(bind: Engine):
+    """
+    Create the star layout, refusing to shadow an existing wide orders table
+    :param bind: SQLAlchemy engine
+    """
+    if bind.dialect.name != "sqlite":
+        raise RuntimeError("STORAGE_LAYOUT=star is only supported on SQLite")
+    if has_wide_orders(bind):
+        raise RuntimeError(
+            "The database has a wide orders table, convert it with "
+            "python -m src.db.star before setting STORAGE_LAYOUT=star"
+        )
+
+    with bind.begin() as connection:
+        create_star_schema(connection)
+
+
+def convert_to_star(bind: Engine):
+    """
+    Move the rows of a wide orders table into the star tables, then replace the
+    table with the orders view. Runs in one transaction
+    :param bind: SQLAlchemy engine
+    """
+    if not has_wide_orders(bind):
+        logger.info("Nothing to convert, orders is not a table")
+        return
+
+    with bind.begin() as connection:
+        connection.execute(text("ALTER TABLE orders RENAME TO orders_wide"))
+        StarBase.metadata.create_all(connection)
+
+        for table, (_, columns) in dimensions.items():
+            logger.info(f"Filling {table}...")
+            connection.execute(
+                text(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"SELECT DISTINCT {', '.join(columns)} FROM orders_wide"
+                )
+            )
+
+        logger.info("Filling order_lines...")
+        keys = [key for key, _ in dimensions.values()]
+        connection.execute(
+            text(
+                f"INSERT INTO order_lines ({', '.join(fact_columns + keys)}) "
+                f"SELECT {', '.join(f'o.{column}' for column in fact_columns)}, "
+                f"{', '.join(f'{table}.id' for table in dimensions)} "
+                "FROM orders_wide o "
+                + " ".join(
+                    f"JOIN {table} ON {dimension_match(table, columns, 'o')}"
+                    for table, (_, columns) in dimensions.items()
+                )
+            )
+        )
+
+        connection.execute(text("DROP TABLE orders_wide"))
+        create_star_schema(connection)
+        connection.execute(text("ANALYZE"))
+
+    # Give the wide table's pages back to the file system
+    with bind.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT").execute(
+            text("VACUUM")
+        )
+    logger.info("Converted orders to the star layout")
+
+
+def upsert_rows(connection: Connection, records: List[dict]) -> List[Tuple]:
+    """
+    Upsert orders through the view, which can't take ON CONFLICT: the chunk is
+    staged, rows that are new or differ are deleted and re-inserted
+    :param connection: SQLAlchemy connection in a transaction
+    :param records: Order column dicts
+    :return: (id, order_date) of the rows inserted or updated
+    """
+    orders = Order.__table__
+    staging.create(connection, checkfirst=True)
+    connection.execute(delete(staging))
+    connection.execute(insert(staging), records)
+
+    columns = [column.name for column in orders.columns if column.name != "id"]
+    written = connection.execute(
+        select(staging.c.id, staging.c.order_date)
+        .outerjoin(orders, orders.c.id == staging.c.id)
+        .where(
+            or_(
+                orders.c.id.is_(None),
+                *(
+                    staging.c[column].is_distinct_from(orders.c[column])
+                    for column in columns
+                ),
+            )
+        )
+    ).all()
+    if not written:
+        return written
+
+    ids = [row_id for row_id, _ in written]
+    connection.execute(delete(orders).where(orders.c.id.in_(ids)))
+    connection.execute(
+        insert(orders).from_select(
+            [column.name for column in staging.columns],
+            select(staging).where(staging.c.id.in_(ids)),
+        )
+    )
+
+    return written
+
+
+if __name__ == "__main__":
+    from src.db.connection import engine
+
+    convert_to_star(engine)
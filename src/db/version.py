@@ -0,0 +1,74 @@
+import uuid
+from typing import Optional, Tuple, Union
+
+from sqlalchemy import select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.db.model import DatabaseIdentity, DataVersion
+
+
+def get_data_version(bind: Union[Session, Connection]) -> Tuple[int, int]:
+    """
+    Get the current data version of the orders table
+    :param bind: SQLAlchemy session or connection
+    :return: Tuple of (version, base_version)
+    """
+    row = bind.execute(
+        select(DataVersion.version, DataVersion.base_version).where(DataVersion.id == 1)
+    ).first()
+
+    return (row.version, row.base_version) if row else (0, 0)
+
+
+def get_database_id(bind: Union[Session, Connection]) -> Optional[str]:
+    """
+    Get the random id identifying this database, see DatabaseIdentity
+    :param bind: SQLAlchemy session or connection
+    :return: Database id, None before ensure_database_id first ran
+    """
+    return bind.execute(
+        select(DatabaseIdentity.database_id).where(DatabaseIdentity.id == 1)
+    ).scalar()
+
+
+def ensure_database_id(bind: Union[Session, Connection]) -> str:
+    """
+    Give the database its random id if it has none yet
+    :param bind: SQLAlchemy session or connection in a transaction
+    :return: Database id
+    """
+    database_id = get_database_id(bind)
+    if database_id is None:
+        database_id = uuid.uuid4().hex
+        bind.execute(
+            DatabaseIdentity.__table__.insert().values(id=1, database_id=database_id)
+        )
+
+    return database_id
+
+
+def bump_data_version(
+    bind: Union[Session, Connection], append_only: bool = True
+) -> int:
+    """
+    Bump the data version, call in the same transaction as the write
+    :param bind: SQLAlchemy session or connection
+    :param append_only: The write only added new orders, so cached copies
+        can catch up by appending rows with a higher id
+    :return: New version
+    """
+    values = {"version": DataVersion.version + 1}
+    if not append_only:
+        values["base_version"] = DataVersion.version + 1
+
+    result = bind.execute(
+        update(DataVersion).where(DataVersion.id == 1).values(**values)
+    )
+    if not result.rowcount:
+        bind.execute(
+            DataVersion.__table__.insert().values(id=1, version=1, base_version=1)
+        )
+        ensure_database_id(bind)
+
+    return get_data_version(bind)[0]
@@ -0,0 +1,260 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Iterator, List, Optional
+from urllib.parse import urlencode
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from flask import Flask, Response, abort, request
+from openpyxl import Workbook
+from sqlalchemy import Date, Float, Integer
+
+from src.db.connection import ReadSessionLocal
+from src.db.crud import filter_orders, parse_filter_query, sort_clauses
+from src.db.model import Order
+from src.db.search import search_orders, search_rank
+
+# Rows fetched from the database and written per step of an export
+export_chunk_size = int(os.environ.get("EXPORT_CHUNK_SIZE", 5000))
+# Dropdown filters accepted as query parameters, see get_table_filters
+export_filters = (
+    "country_region",
+    "state_province",
+    "city",
+    "category",
+    "sub_category",
+)
+# Excel's row limit, including the header row
+xlsx_max_rows = 1_048_576
+
+export_mimetypes = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def export_url(
+    export_format: str,
+    filters: dict,
+    sort_by: Optional[List[dict]] = None,
+    filter_query: Optional[str] = None,
+    search: Optional[str] = None,
+) -> str:
+    """
+    Link to the export of the table page's current result set
+    :param export_format: "csv", "parquet" or "xlsx"
+    :param filters: Mapping of Order column name to selected value
+    :param sort_by: DataTable sort_by list of column_id/direction dicts
+    :param filter_query: DataTable filter_query string
+    :param search: Full-text search
+    :return: Relative URL
+    """
+    params = {column: value for column, value in filters.items() if value}
+    if sort_by:
+        params["sort_by"] = json.dumps(sort_by)
+    if filter_query:
+        params["filter_query"] = filter_query
+    if search:
+        params["search"] = search
+
+    query = urlencode(params)
+    return f"/export/orders.{export_format}" + (f"?{query}" if query else "")
+
+
+def stream_orders(
+    filters: dict,
+    sort_by: Optional[List[dict]],
+    filter_query: Optional[str],
+    search: Optional[str] = None,
+) -> Iterator[list]:
+    """
+    Stream the filtered orders from the database without loading them all,
+    the read session stays open until the iterator is exhausted or closed
+    :param filters: Mapping of Order column name to selected value
+    :param sort_by: DataTable sort_by list of column_id/direction dicts
+    :param filter_query: DataTable filter_query string
+    :param search: Full-text search
+    :return: Iterator of lists of row tuples, in Order column order
+    """
+    with ReadSessionLocal() as session:
+        query = filter_orders(session.query(*Order.__table__.columns), filters)
+        query = query.filter(*parse_filter_query(filter_query))
+        query = search_orders(query, search)
+
+        # Same order as the table page, see get_orders_page
+        order_by = sort_clauses(sort_by)
+        order_by[-1:-1] = search_rank(query, search)
+        stmt = query.order_by(*order_by).statement
+
+        result = session.execute(
+            stmt, execution_options={"yield_per": export_chunk_size}
+        )
+        for rows in result.partitions():
+            yield rows
+
+
+def csv_chunks(chunks: Iterator[list]) -> Iterator[bytes]:
+    """
+    Encode orders as CSV
+    :param chunks: Iterator of lists of row tuples
+    :return: Iterator of CSV bytes, the header first
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(Order.__table__.columns.keys())
+
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    yield buffer.getvalue().encode()
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Write-only file that keeps what was written until it is drained, so a
+    writer's output can be streamed as it is produced
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        """
+        Take the bytes written since the last drain
+        :return: Bytes
+        """
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def arrow_schema() -> pa.Schema:
+    """
+    Arrow schema of the Order columns
+    :return: pyarrow Schema
+    """
+    types = {Integer: pa.int64(), Float: pa.float64(), Date: pa.date32()}
+    return pa.schema(
+        [
+            (column.key, types.get(type(column.type), pa.string()))
+            for column in Order.__table__.columns
+        ]
+    )
+
+
+def parquet_chunks(chunks: Iterator[list]) -> Iterator[bytes]:
+    """
+    Encode orders as Parquet, one row group per chunk
+    :param chunks: Iterator of lists of row tuples
+    :return: Iterator of Parquet bytes, the footer last
+    """
+    schema = arrow_schema()
+    sink = ChunkSink()
+
+    with pq.ParquetWriter(sink, schema) as writer:
+        for rows in chunks:
+            columns = zip(*rows)
+            writer.write_table(
+                pa.Table.from_arrays(
+                    [
+                        pa.array(values, type=field.type)
+                        for values, field in zip(columns, schema)
+                    ],
+                    schema=schema,
+                )
+            )
+            yield sink.drain()
+
+    yield sink.drain()
+
+
+def xlsx_chunks(chunks: Iterator[list]) -> Iterator[bytes]:
+    """
+    Encode orders as an Excel workbook. Write-only mode spools the rows to a
+    temporary file instead of memory, the zipped workbook is streamed from disk
+    once complete. Rows past Excel's limit continue on further sheets
+    :param chunks: Iterator of lists of row tuples
+    :return: Iterator of XLSX bytes
+    """
+    workbook = Workbook(write_only=True)
+    header = Order.__table__.columns.keys()
+    sheet = None
+    sheet_rows = xlsx_max_rows
+
+    for rows in chunks:
+        for row in rows:
+            if sheet_rows == xlsx_max_rows:
+                sheet = workbook.create_sheet(f"Orders {len(workbook.worksheets) + 1}")
+                sheet.append(header)
+                sheet_rows = 1
+            sheet.append(tuple(row))
+            sheet_rows += 1
+
+    if sheet is None:
+        workbook.create_sheet("Orders 1").append(header)
+
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        while data := file.read(1024 * 1024):
+            yield data
+
+
+export_writers = {"csv": csv_chunks, "parquet": parquet_chunks, "xlsx": xlsx_chunks}
+
+
+def register_export_routes(server: Flask):
+    """
+    Add /export/orders.<format>, streaming the orders matching the table page's
+    filters as a download. Takes the dropdown filters, sort_by (DataTable JSON),
+    filter_query and search as query parameters, see export_url
+    :param server: Flask server, app.server
+    """
+
+    @server.route("/export/orders.<export_format>")
+    def export_orders(export_format: str):
+        if export_format not in export_writers:
+            abort(404)
+
+        filters = {column: request.args.get(column) for column in export_filters}
+        try:
+            sort_by = json.loads(request.args.get("sort_by") or "[]")
+        except ValueError:
+            abort(400)
+        if not isinstance(sort_by, list) or not all(
+            isinstance(sort, dict) for sort in sort_by
+        ):
+            abort(400)
+        filter_query = request.args.get("filter_query")
+
+        chunks = stream_orders(
+            filters, sort_by, filter_query, request.args.get("search")
+        )
+        filename = f"orders-{datetime.now():%Y%m%d-%H%M%S}.{export_format}"
+
+        return Response(
+            export_writers[export_format](chunks),
+            mimetype=export_mimetypes[export_format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
@@ -0,0 +1,146 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import flask
+from dash import Dash
+from flask import Response, request
+from loguru import logger
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Log callbacks slower than this many milliseconds, 0 to disable
+slow_callback_ms = float(os.environ.get("SLOW_CALLBACK_MS", 0))
+
+callback_duration = Histogram(
+    "dash_callback_duration_seconds",
+    "Wall time of Dash callback requests",
+    ["callback"],
+)
+callback_sql_statements = Histogram(
+    "dash_callback_sql_statements",
+    "SQL statements executed per Dash callback request",
+    ["callback"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+callback_sql_duration = Histogram(
+    "dash_callback_sql_duration_seconds",
+    "Total SQL statement time per Dash callback request",
+    ["callback"],
+)
+callback_response_bytes = Histogram(
+    "dash_callback_response_bytes",
+    "Serialized response size of Dash callback requests",
+    ["callback"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+
+# [statements, seconds] of the callback request being served, None outside one
+sql_stats: ContextVar[Optional[list]] = ContextVar("sql_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.statement_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = sql_stats.get()
+    if stats is not None and context is not None:
+        stats[0] += 1
+        stats[1] += time.perf_counter() - context.statement_started
+
+
+def callback_name(app: Dash, body: Optional[dict]) -> str:
+    """
+    Name of the function serving a callback request
+    :param app: Dash app
+    :param body: JSON body of the _dash-update-component request
+    :return: Function name, or the output id if it is unknown
+    """
+    output = (body or {}).get("output", "unknown")
+    func = app.callback_map.get(output, {}).get("callback")
+
+    return getattr(func, "__name__", output)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry to export, merging every worker's metrics when
+    PROMETHEUS_MULTIPROC_DIR is set
+    :return: CollectorRegistry
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return registry
+
+
+def register_metrics(app: Dash):
+    """
+    Time every callback request with its SQL statements and response size, and
+    expose the histograms on /metrics in the Prometheus text format
+    :param app: Dash app
+    """
+    server = app.server
+    dispatch_path = f"{app.config.routes_pathname_prefix}_dash-update-component"
+
+    @server.before_request
+    def start_callback_timer():
+        if request.path != dispatch_path:
+            return
+
+        flask.g.callback_sql = [0, 0.0]
+        flask.g.callback_sql_token = sql_stats.set(flask.g.callback_sql)
+        flask.g.callback_started = time.perf_counter()
+
+    @server.after_request
+    def record_response_size(response: Response) -> Response:
+        if "callback_started" in flask.g:
+            flask.g.callback_response_bytes = response.calculate_content_length() or 0
+        return response
+
+    # Teardown runs even when the callback raised, unlike after_request
+    @server.teardown_request
+    def record_callback(error: Optional[BaseException]):
+        started = flask.g.pop("callback_started", None)
+        if started is None:
+            return
+
+        elapsed = time.perf_counter() - started
+        sql_stats.reset(flask.g.pop("callback_sql_token"))
+        statements, sql_seconds = flask.g.pop("callback_sql")
+        size = flask.g.pop("callback_response_bytes", 0)
+        name = callback_name(app, request.get_json(silent=True))
+
+        callback_duration.labels(name).observe(elapsed)
+        callback_sql_statements.labels(name).observe(statements)
+        callback_sql_duration.labels(name).observe(sql_seconds)
+        callback_response_bytes.labels(name).observe(size)
+
+        if slow_callback_ms and elapsed * 1000 >= slow_callback_ms:
+            logger.warning(
+                f"Slow callback {name}: {elapsed * 1000:.0f} ms, {statements} SQL "
+                f"statements in {sql_seconds * 1000:.0f} ms, {size} bytes"
+            )
+
+    @server.route("/metrics")
+    def metrics():
+        return Response(
+            generate_latest(metrics_registry()),
+            headers={"Content-Type": CONTENT_TYPE_LATEST},
+        )
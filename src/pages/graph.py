@@ -1,31 +1,25 @@
+import os
+
 import dash_bootstrap_components as dbc
+import numpy as np
 import pandas as pd
 import plotly.express as px
-from dash import Input, Output, callback, dcc, html
-
-from src.db.connection import SessionLocal
-from src.db.model import Order
-
-# Load the data
-with SessionLocal() as session:
-    # Query all data from the orders table
-    orders = session.query(Order).order_by(Order.id.desc()).all()
-
-    # Convert ORM objects to a DataFrame
-    df = pd.DataFrame([order.__dict__ for order in orders])
-    df.drop(columns=["_sa_instance_state"], inplace=True)  # Remove SQLAlchemy state
-
-# Convert SQLAlchemy Date to datetime
-df["order_date"] = pd.to_datetime(
-    df["order_date"].astype(str), errors="coerce"
-)  # Convert to datetime
-df["dispatch_date"] = pd.to_datetime(
-    df["dispatch_date"].astype(str), errors="coerce"
-)  # Convert to datetime
+from dash import (
+    ClientsideFunction,
+    Input,
+    Output,
+    State,
+    clientside_callback,
+    dcc,
+    html,
+)
 
-# Calculate additional columns
-df["days_to_ship"] = (df["dispatch_date"] - df["order_date"]).dt.days
-df["profit_ratio"] = df["profit"] / df["sales"]
+from src.background import background_callback, report_progress
+from src.cache import memoize
+from src.db.connection import ReadSessionLocal, read_engine
+from src.db.crud import get_overview_metrics
+from src.db.dataset import orders_dataset
+from src.db.rollup import read_daily_rollup
 
 # List of expected numerical columns
 numerical_columns = [
@@ -38,192 +32,259 @@ numerical_columns = [
     "sales",
 ]
 
-# Calculate the first day of the month of the max order_date
-min_order_date = df["order_date"].min()
-max_order_date = df["order_date"].max()
-
-# Define the layout for the graph page
-graph_page_layout = dbc.Container(
-    [
-        dbc.Row([dbc.Col(html.H2("Graph"))]),
-        html.Br(),
-        dbc.Row(
-            [
-                dbc.Col(
-                    [
-                        dcc.DatePickerRange(
-                            id="date-picker-range",
-                            start_date=min_order_date.date(),
-                            end_date=max_order_date.date(),
-                        ),
-                    ],
-                    width=12,
-                    className="mt-2 mb-2",
-                ),
-            ]
-        ),
-        dcc.Loading(
-            id="loading",
-            type="default",
-            children=[
-                dbc.Row(
-                    [
-                        dbc.Col(
-                            [
-                                dbc.Row(
-                                    [
-                                        dbc.Col(
-                                            [
-                                                dcc.Dropdown(
-                                                    id="granularity-dropdown",
-                                                    options=[
-                                                        {
-                                                            "label": "Daily",
-                                                            "value": "D",
-                                                        },
-                                                        {"label": "Week", "value": "W"},
-                                                        {
-                                                            "label": "Month",
-                                                            "value": "ME",
-                                                        },
-                                                        {
-                                                            "label": "Quarter",
-                                                            "value": "QE",
-                                                        },
-                                                        {
-                                                            "label": "Year",
-                                                            "value": "YE",
-                                                        },
-                                                    ],
-                                                    value="ME",
-                                                )
-                                            ],
-                                            width=4,
-                                            align="start",
-                                        ),
-                                    ]
-                                ),
-                                dcc.Graph(id="timeline-graph"),
-                            ],
-                            width=6,
-                            align="start",
-                            className="mt-2 mb-2",
+# Axis dropdown options, also embedded in the layout for the clientside callbacks
+numerical_column_options = [
+    {"label": col.replace("_", " ").title(), "value": col} for col in numerical_columns
+]
+
+# Most points drawn in the bubble chart, larger ranges are downsampled and
+# rendered with WebGL
+bubble_point_budget = int(os.environ.get("BUBBLE_CHART_POINT_BUDGET", 5000))
+
+
+def downsample(df: pd.DataFrame, by: str, budget: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Randomly sample at most budget rows, stratified by a column so small groups
+    keep all of their points and large groups share the rest equally
+    :param df: DataFrame to sample
+    :param by: Column to stratify by
+    :param budget: Maximum number of rows to keep
+    :param seed: Random seed, fixed so the chart doesn't jitter between calls
+    :return: Sampled DataFrame
+    """
+    if len(df) <= budget:
+        return df
+
+    shuffled = df.sample(frac=1, random_state=seed)
+    codes, _ = pd.factorize(shuffled[by], use_na_sentinel=False)
+    sizes = np.bincount(codes)
+
+    # Fill groups from smallest to largest with an equal share of the budget
+    quotas = np.zeros_like(sizes)
+    remaining = budget
+    for position, group in enumerate(np.argsort(sizes, kind="stable")):
+        share = remaining // (len(sizes) - position)
+        quotas[group] = min(sizes[group], share)
+        remaining -= quotas[group]
+
+    rank = shuffled.groupby(codes, sort=False).cumcount().to_numpy()
+    return shuffled[rank < quotas[codes]]
+
+
+def graph_page_layout():
+    """
+    Layout for the graph page, built per visit so the date range is current
+    """
+    with ReadSessionLocal() as session:
+        metrics = get_overview_metrics(session)
+
+    return dbc.Container(
+        [
+            dbc.Row([dbc.Col(html.H2("Graph"))]),
+            dcc.Store(id="numerical-columns", data=numerical_column_options),
+            html.Br(),
+            dbc.Row(
+                [
+                    dbc.Col(
+                        [
+                            dcc.DatePickerRange(
+                                id="date-picker-range",
+                                start_date=metrics["start_date"],
+                                end_date=metrics["end_date"],
+                            ),
+                        ],
+                        width=12,
+                        className="mt-2 mb-2",
+                    ),
+                ]
+            ),
+            # Shown while the graphs are computed by background callbacks
+            dbc.Row(
+                [
+                    dbc.Col(
+                        dbc.Progress(
+                            id="timeline-progress",
+                            striped=True,
+                            animated=True,
+                            style={"visibility": "hidden"},
                         ),
-                        dbc.Col(
-                            [
-                                dbc.Row(
-                                    [
-                                        dbc.Col(
-                                            [
-                                                dcc.Dropdown(
-                                                    id="x-axis-dropdown",
-                                                    options=[
-                                                        {
-                                                            "label": col.replace(
-                                                                "_", " "
-                                                            ).title(),
-                                                            "value": col,
-                                                        }
-                                                        for col in numerical_columns
-                                                    ],
-                                                    value="sales",
-                                                )
-                                            ],
-                                            width=4,
-                                            align="start",
-                                        ),
-                                        dbc.Col(
-                                            [
-                                                dcc.Dropdown(
-                                                    id="y-axis-dropdown",
-                                                    options=[
-                                                        {
-                                                            "label": col.replace(
-                                                                "_", " "
-                                                            ).title(),
-                                                            "value": col,
-                                                        }
-                                                        for col in numerical_columns
-                                                    ],
-                                                    value="profit",
-                                                )
-                                            ],
-                                            width=4,
-                                            align="start",
-                                        ),
-                                        dbc.Col(
-                                            [
-                                                dcc.Dropdown(
-                                                    id="breakdown-dropdown",
-                                                    options=[
-                                                        {
-                                                            "label": "Segment",
-                                                            "value": "segment",
-                                                        },
-                                                        {
-                                                            "label": "Ship Mode",
-                                                            "value": "delivery_mode",
-                                                        },
-                                                        {
-                                                            "label": "Customer Name",
-                                                            "value": "customer_name",
-                                                        },
-                                                        {
-                                                            "label": "Category",
-                                                            "value": "category",
-                                                        },
-                                                        {
-                                                            "label": "Sub-Category",
-                                                            "value": "sub_category",
-                                                        },
-                                                        {
-                                                            "label": "Product Name",
-                                                            "value": "product_name",
-                                                        },
-                                                    ],
-                                                    value="category",
-                                                )
-                                            ],
-                                            width=4,
-                                            align="start",
-                                        ),
-                                    ],
-                                    className="mt-2 mb-2",
-                                ),
-                                dcc.Graph(id="bubble-chart"),
-                            ],
-                            width=6,
+                        width=6,
+                    ),
+                    dbc.Col(
+                        dbc.Progress(
+                            id="bubble-progress",
+                            striped=True,
+                            animated=True,
+                            style={"visibility": "hidden"},
                         ),
-                    ]
-                ),
-            ],
-        ),
-    ],
-    fluid=True,
-)
+                        width=6,
+                    ),
+                ]
+            ),
+            dcc.Loading(
+                id="loading",
+                type="default",
+                children=[
+                    dbc.Row(
+                        [
+                            dbc.Col(
+                                [
+                                    dbc.Row(
+                                        [
+                                            dbc.Col(
+                                                [
+                                                    dcc.Dropdown(
+                                                        id="granularity-dropdown",
+                                                        options=[
+                                                            {
+                                                                "label": "Daily",
+                                                                "value": "D",
+                                                            },
+                                                            {
+                                                                "label": "Week",
+                                                                "value": "W",
+                                                            },
+                                                            {
+                                                                "label": "Month",
+                                                                "value": "ME",
+                                                            },
+                                                            {
+                                                                "label": "Quarter",
+                                                                "value": "QE",
+                                                            },
+                                                            {
+                                                                "label": "Year",
+                                                                "value": "YE",
+                                                            },
+                                                        ],
+                                                        value="ME",
+                                                    )
+                                                ],
+                                                width=4,
+                                                align="start",
+                                            ),
+                                        ]
+                                    ),
+                                    dcc.Graph(id="timeline-graph"),
+                                ],
+                                width=6,
+                                align="start",
+                                className="mt-2 mb-2",
+                            ),
+                            dbc.Col(
+                                [
+                                    dbc.Row(
+                                        [
+                                            dbc.Col(
+                                                [
+                                                    dcc.Dropdown(
+                                                        id="x-axis-dropdown",
+                                                        options=numerical_column_options,
+                                                        value="sales",
+                                                    )
+                                                ],
+                                                width=4,
+                                                align="start",
+                                            ),
+                                            dbc.Col(
+                                                [
+                                                    dcc.Dropdown(
+                                                        id="y-axis-dropdown",
+                                                        options=numerical_column_options,
+                                                        value="profit",
+                                                    )
+                                                ],
+                                                width=4,
+                                                align="start",
+                                            ),
+                                            dbc.Col(
+                                                [
+                                                    dcc.Dropdown(
+                                                        id="breakdown-dropdown",
+                                                        options=[
+                                                            {
+                                                                "label": "Segment",
+                                                                "value": "segment",
+                                                            },
+                                                            {
+                                                                "label": "Ship Mode",
+                                                                "value": "delivery_mode",
+                                                            },
+                                                            {
+                                                                "label": "Customer Name",
+                                                                "value": "customer_name",
+                                                            },
+                                                            {
+                                                                "label": "Category",
+                                                                "value": "category",
+                                                            },
+                                                            {
+                                                                "label": "Sub-Category",
+                                                                "value": "sub_category",
+                                                            },
+                                                            {
+                                                                "label": "Product Name",
+                                                                "value": "product_name",
+                                                            },
+                                                        ],
+                                                        value="category",
+                                                    )
+                                                ],
+                                                width=4,
+                                                align="start",
+                                            ),
+                                        ],
+                                        className="mt-2 mb-2",
+                                    ),
+                                    dcc.Graph(id="bubble-chart"),
+                                ],
+                                width=6,
+                            ),
+                        ]
+                    ),
+                ],
+            ),
+        ],
+        fluid=True,
+    )
 
 
 # Callback for updating the timeline graph
-@callback(
+@background_callback(
     Output("timeline-graph", "figure"),
     Input("date-picker-range", "start_date"),
     Input("date-picker-range", "end_date"),
     Input("granularity-dropdown", "value"),
+    progress=[
+        Output("timeline-progress", "value"),
+        Output("timeline-progress", "label"),
+    ],
+    running=[
+        (
+            Output("timeline-progress", "style"),
+            {"visibility": "visible"},
+            {"visibility": "hidden"},
+        )
+    ],
+    cancel=[Input("url", "pathname")],
 )
+@memoize
 def update_timeline_graph(start_date, end_date, granularity):
     # Convert start_date and end_date to datetime objects
     start_date = pd.to_datetime(start_date, errors="coerce")
     end_date = pd.to_datetime(end_date, errors="coerce")
 
-    # Filter DataFrame
-    dff = df[(df["order_date"] >= start_date) & (df["order_date"] <= end_date)]
+    if pd.isna(start_date) or pd.isna(end_date):
+        return px.line()  # Return an empty figure if the range is invalid
+
+    # Read the pre-summed daily rollup, indexed by order_date
+    report_progress(10, "Reading")
+    with read_engine.connect() as connection:
+        dff = read_daily_rollup(connection, start_date.date(), end_date.date())
 
     if dff.empty:
         return px.line()  # Return an empty figure if no data is available
 
-    # Ensure 'order_date' is the index
-    dff.set_index("order_date", inplace=True)
-
     # Ensure only numerical columns are included
     numerical_columns_present = [col for col in numerical_columns if col in dff.columns]
 
@@ -235,6 +296,7 @@ def update_timeline_graph(start_date, end_date, granularity):
     if granularity not in ["D", "W", "ME", "QE", "YE"]:
         granularity = "ME"
 
+    report_progress(40, "Resampling")
     try:
         dff_resampled = (
             dff[numerical_columns_present].resample(granularity).sum().reset_index()
@@ -244,27 +306,42 @@ def update_timeline_graph(start_date, end_date, granularity):
         return px.line()  # Return an empty figure if resampling fails
 
     # Create line plot
+    report_progress(70, "Plotting")
     figure = px.line(dff_resampled, x="order_date", y=numerical_columns_present)
     figure.update_layout(title="Timeline Graph")
     return figure
 
 
 # Callback for updating the bubble chart
-@callback(
+@background_callback(
     Output("bubble-chart", "figure"),
     Input("x-axis-dropdown", "value"),
     Input("y-axis-dropdown", "value"),
     Input("breakdown-dropdown", "value"),
     Input("date-picker-range", "start_date"),
     Input("date-picker-range", "end_date"),
+    progress=[
+        Output("bubble-progress", "value"),
+        Output("bubble-progress", "label"),
+    ],
+    running=[
+        (
+            Output("bubble-progress", "style"),
+            {"visibility": "visible"},
+            {"visibility": "hidden"},
+        )
+    ],
+    cancel=[Input("url", "pathname")],
 )
+@memoize
 def update_bubble_chart(x_axis, y_axis, breakdown, start_date, end_date):
     # Convert start_date and end_date to datetime objects
     start_date = pd.to_datetime(start_date, errors="coerce")
     end_date = pd.to_datetime(end_date, errors="coerce")
 
-    # Filter DataFrame
-    dff = df[(df["order_date"] >= start_date) & (df["order_date"] <= end_date)]
+    # Slice the date range out of the dataset, which is sorted by order_date
+    report_progress(10, "Reading")
+    dff = orders_dataset.slice(start_date, end_date)
 
     if dff.empty:
         return px.scatter()  # Return an empty figure if no data is available
@@ -273,7 +350,16 @@ def update_bubble_chart(x_axis, y_axis, breakdown, start_date, end_date):
     if x_axis not in dff.columns or y_axis not in dff.columns:
         return px.scatter()  # Return an empty figure if any axis is missing
 
+    # Cap the number of points sent to the browser
+    report_progress(40, "Sampling")
+    total_points = len(dff)
+    if breakdown in dff.columns:
+        dff = downsample(dff, breakdown, bubble_point_budget)
+    else:
+        dff = dff.sample(n=min(total_points, bubble_point_budget), random_state=0)
+
     # Create scatter plot
+    report_progress(70, "Plotting")
     figure = px.scatter(
         dff,
         x=x_axis,
@@ -282,25 +368,25 @@ def update_bubble_chart(x_axis, y_axis, breakdown, start_date, end_date):
         color=breakdown,
         hover_name=breakdown,
         size_max=60,
+        render_mode="webgl" if total_points > bubble_point_budget else "svg",
+    )
+    figure.update_layout(
+        title=f"Bubble Chart ({len(dff):,} of {total_points:,} points)"
     )
-    figure.update_layout(title="Bubble Chart")
     return figure
 
 
-# Callback to exclude selected axis in other dropdown
-@callback(Output("y-axis-dropdown", "options"), Input("x-axis-dropdown", "value"))
-def set_y_axis_options(selected_x):
-    options = [
-        {"label": col.replace("_", " ").title(), "value": col}
-        for col in numerical_columns
-    ]
-    return [option for option in options if option["value"] != selected_x]
-
-
-@callback(Output("x-axis-dropdown", "options"), Input("y-axis-dropdown", "value"))
-def set_x_axis_options(selected_y):
-    options = [
-        {"label": col.replace("_", " ").title(), "value": col}
-        for col in numerical_columns
-    ]
-    return [option for option in options if option["value"] != selected_y]
+# Exclude the selected axis in the other dropdown, in the browser, see
+# assets/javascipt/callbacks.js
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="exclude_selected_axis"),
+    Output("y-axis-dropdown", "options"),
+    Input("x-axis-dropdown", "value"),
+    State("numerical-columns", "data"),
+)
+clientside_callback(
+    ClientsideFunction(namespace="graph", function_name="exclude_selected_axis"),
+    Output("x-axis-dropdown", "options"),
+    Input("y-axis-dropdown", "value"),
+    State("numerical-columns", "data"),
+)
@@ -1,7 +1,9 @@
 import dash_bootstrap_components as dbc
 from dash import Input, Output, callback, dcc, html
+from dash.exceptions import PreventUpdate
 
-from src.db.connection import SessionLocal
+from src.cache import memoize
+from src.db.connection import ReadSessionLocal
 from src.db.crud import get_overview_metrics
 
 # Define the layout for the landing page
@@ -166,9 +168,13 @@ landing_page_layout = dbc.Container(
     Output("date_range_ratio", "children"),
     Input("url", "pathname"),
 )
+@memoize
 def update_metrics(pathname):
-    # Load the data each time the page is loaded
-    with SessionLocal() as session:
+    # Only the landing page shows the metric cards
+    if pathname != "/landing":
+        raise PreventUpdate
+
+    with ReadSessionLocal() as session:
         metrics = get_overview_metrics(session)
 
     total_orders = metrics.get("total_orders", 0)
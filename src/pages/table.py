@@ -1,18 +1,80 @@
-from datetime import datetime
+from datetime import date, datetime
 
 import dash_bootstrap_components as dbc
-import pandas as pd
-from dash import Input, Output, State, callback, callback_context, dash_table, dcc, html
+from dash import (
+    Input,
+    Output,
+    Patch,
+    State,
+    callback,
+    callback_context,
+    dash_table,
+    dcc,
+    html,
+    no_update,
+)
 from dash.exceptions import PreventUpdate
 from sqlalchemy import func
 
-from src.db.connection import SessionLocal
-from src.db.crud import order_to_dict
+from src.cache import memoize
+from src.db.connection import ReadSessionLocal, SessionLocal
+from src.db.crud import (
+    get_orders_page,
+    get_page_count,
+    order_matches,
+    order_to_dict,
+    update_overview_metrics,
+)
+from src.db.hierarchy import hierarchy_index
 from src.db.model import Order
+from src.db.rollup import refresh_daily_rollup
+from src.db.search import sync_search_index
+from src.db.version import bump_data_version
+from src.export import export_url
 
 default_page_size = 25
 
 
+def column_type(column) -> str:
+    """
+    DataTable column type for an Order column, used by the filter UI
+    :param column: Order column
+    :return: "numeric", "datetime" or "text"
+    """
+    if column.type.python_type in (int, float):
+        return "numeric"
+    if column.type.python_type is date:
+        return "datetime"
+    return "text"
+
+
+@memoize
+def get_table_data(
+    filters: dict, page_current, page_size, sort_by, filter_query, search
+):
+    """
+    Load one page of the data table, cached until the data version changes
+    :return: Tuple of (rows for the page, total number of matching rows)
+    """
+    with ReadSessionLocal() as session:
+        return get_orders_page(
+            session, filters, page_current, page_size, sort_by, filter_query, search
+        )
+
+
+def get_table_filters(country_v, state_v, city_v, category_v, sub_category_v) -> dict:
+    """
+    Map the dropdown values to Order column names
+    """
+    return {
+        "country_region": country_v,
+        "state_province": state_v,
+        "city": city_v,
+        "category": category_v,
+        "sub_category": sub_category_v,
+    }
+
+
 table_page_layout = dbc.Container(
     [
         dbc.Row([dbc.Col(html.H2("Data Table"))]),
@@ -97,6 +159,41 @@ table_page_layout = dbc.Container(
                                     ],
                                     width=2,
                                 ),
+                                dbc.Col(
+                                    [
+                                        dbc.Label("Search"),
+                                        # Full-text search, see src/db/search.py
+                                        search_input := dbc.Input(
+                                            type="search",
+                                            placeholder="Product, customer or city",
+                                            debounce=True,
+                                        ),
+                                    ],
+                                    width=4,
+                                ),
+                                dbc.Col(
+                                    # Links to src/export.py routes, so the browser
+                                    # streams the download straight from the server
+                                    dbc.DropdownMenu(
+                                        [
+                                            dbc.DropdownMenuItem(
+                                                label,
+                                                id=f"export-{export_format}",
+                                                href=export_url(export_format, {}),
+                                                external_link=True,
+                                            )
+                                            for export_format, label in (
+                                                ("csv", "CSV"),
+                                                ("parquet", "Parquet"),
+                                                ("xlsx", "Excel"),
+                                            )
+                                        ],
+                                        label="Export",
+                                        color="secondary",
+                                    ),
+                                    width="auto",
+                                    className="ms-auto align-self-end",
+                                ),
                             ],
                             className="mt-2 mb-2",
                         ),
@@ -104,14 +201,27 @@ table_page_layout = dbc.Container(
                             [
                                 my_table := dash_table.DataTable(
                                     columns=[
-                                        {"name": i, "id": i}
-                                        for i in Order.__table__.columns.keys()
+                                        {
+                                            "name": column.key,
+                                            "id": column.key,
+                                            "type": column_type(column),
+                                        }
+                                        for column in Order.__table__.columns
                                     ],
                                     data=[],
-                                    filter_action="none",
+                                    page_action="custom",
+                                    page_current=0,
                                     page_size=default_page_size,
+                                    page_count=1,
+                                    sort_action="custom",
+                                    sort_mode="multi",
+                                    sort_by=[],
+                                    filter_action="custom",
+                                    filter_query="",
                                     style_table={"overflowX": "auto"},
                                 ),
+                                # Number of rows matching the current filters
+                                table_total := dcc.Store(id="table-total", data=0),
                             ]
                         ),
                     ]
@@ -364,94 +474,94 @@ table_page_layout = dbc.Container(
     Input(state_dropdown, "value"),
     Input(category_dropdown, "value"),
 )
+@memoize
 def set_dropdown_options(selected_country, selected_state, selected_category):
-    with SessionLocal() as session:
-        query = session.query(Order)
-        if selected_country:
-            query = query.filter(Order.country_region == selected_country)
-        if selected_state:
-            query = query.filter(Order.state_province == selected_state)
-        if selected_category:
-            query = query.filter(Order.category == selected_category)
-
-        orders = query.order_by(Order.id.desc()).all()
-        df = pd.DataFrame([o.__dict__ for o in orders])
-
-        country_options = [
-            {"label": country, "value": country}
-            for country in sorted(df["country_region"].unique())
-        ]
-        state_options = (
-            [
-                {"label": state, "value": state}
-                for state in sorted(df["state_province"].unique())
-            ]
-            if selected_country
-            else []
-        )
-        city_options = (
-            [{"label": city, "value": city} for city in sorted(df["city"].unique())]
-            if selected_state
-            else []
-        )
-
-        category_options = [
-            {"label": cat, "value": cat} for cat in sorted(df["category"].unique())
-        ]
-        sub_category_options = (
-            [
-                {"label": sub_cat, "value": sub_cat}
-                for sub_cat in sorted(df["sub_category"].unique())
-            ]
-            if selected_category
-            else []
-        )
-
-        return (
-            country_options,
-            state_options,
-            city_options,
-            category_options,
-            sub_category_options,
+    with ReadSessionLocal() as session:
+        return hierarchy_index.options(
+            session, selected_country, selected_state, selected_category
         )
 
 
 @callback(
     Output(my_table, "data", allow_duplicate=True),
     Output(my_table, "page_size"),
+    Output(my_table, "page_count", allow_duplicate=True),
+    Output(my_table, "page_current"),
+    Output(table_total, "data", allow_duplicate=True),
     Input(country_dropdown, "value"),
     Input(state_dropdown, "value"),
     Input(city_dropdown, "value"),
     Input(category_dropdown, "value"),
     Input(sub_category_dropdown, "value"),
     Input(page_size, "value"),
-    prevent_initial_call=True,
+    Input(my_table, "page_current"),
+    Input(my_table, "sort_by"),
+    Input(my_table, "filter_query"),
+    Input(search_input, "value"),
+    prevent_initial_call="initial_duplicate",
 )
 def update_table_data(
-    country_v, state_v, city_v, category_v, sub_category_v, page_size
+    country_v,
+    state_v,
+    city_v,
+    category_v,
+    sub_category_v,
+    page_size,
+    page_current,
+    sort_by,
+    filter_query,
+    search,
 ):
-    with SessionLocal() as session:
-        query = session.query(Order)
-        if country_v:
-            query = query.filter(Order.country_region == country_v)
-        if state_v:
-            query = query.filter(Order.state_province == state_v)
-        if city_v:
-            query = query.filter(Order.city == city_v)
-        if category_v:
-            query = query.filter(Order.category == category_v)
-        if sub_category_v:
-            query = query.filter(Order.sub_category == sub_category_v)
+    # Go back to the first page whenever the result set changes
+    if not any(
+        prop_id.endswith(".page_current")
+        for prop_id in callback_context.triggered_prop_ids
+    ):
+        page_current = 0
+
+    filters = get_table_filters(country_v, state_v, city_v, category_v, sub_category_v)
+    results, total = get_table_data(
+        filters, page_current, page_size, sort_by, filter_query, search
+    )
 
-        orders = query.order_by(Order.id.desc()).all()
-        results = order_to_dict(orders)
+    return results, page_size, get_page_count(total, page_size), page_current, total
 
-        return results, page_size
+
+@callback(
+    Output("export-csv", "href"),
+    Output("export-parquet", "href"),
+    Output("export-xlsx", "href"),
+    Input(country_dropdown, "value"),
+    Input(state_dropdown, "value"),
+    Input(city_dropdown, "value"),
+    Input(category_dropdown, "value"),
+    Input(sub_category_dropdown, "value"),
+    Input(my_table, "sort_by"),
+    Input(my_table, "filter_query"),
+    Input(search_input, "value"),
+)
+def update_export_links(
+    country_v,
+    state_v,
+    city_v,
+    category_v,
+    sub_category_v,
+    sort_by,
+    filter_query,
+    search,
+):
+    filters = get_table_filters(country_v, state_v, city_v, category_v, sub_category_v)
+    return [
+        export_url(export_format, filters, sort_by, filter_query, search)
+        for export_format in ("csv", "parquet", "xlsx")
+    ]
 
 
 @callback(
     Output("id-input", "value"),
     Output(my_table, "data"),
+    Output(my_table, "page_count"),
+    Output(table_total, "data"),
     Output("success-alert", "is_open"),
     Output("error-alert", "is_open"),
     [
@@ -480,6 +590,17 @@ def update_table_data(
     State("quantity-input", "value"),
     State("discount-input", "value"),
     State("profit-input", "value"),
+    State(country_dropdown, "value"),
+    State(state_dropdown, "value"),
+    State(city_dropdown, "value"),
+    State(category_dropdown, "value"),
+    State(sub_category_dropdown, "value"),
+    State(my_table, "page_current"),
+    State(my_table, "page_size"),
+    State(my_table, "sort_by"),
+    State(my_table, "filter_query"),
+    State(search_input, "value"),
+    State(table_total, "data"),
     prevent_initial_call=True,
 )
 def update_table_and_row_id(
@@ -504,6 +625,17 @@ def update_table_and_row_id(
     quantity,
     discount,
     profit,
+    country_v,
+    state_v,
+    city_v,
+    category_v,
+    sub_category_v,
+    page_current,
+    table_page_size,
+    sort_by,
+    filter_query,
+    search,
+    total,
 ):
     ctx = callback_context
     clear_inputs = [""] * (len(Order.__table__.columns.keys()) - 1)
@@ -535,16 +667,16 @@ def update_table_and_row_id(
     else:
         trigger_id = ctx.triggered[0]["prop_id"].split(".")[0]
 
+    # The table itself is loaded by update_table_data, only patch it here
+    unchanged = [no_update, no_update, no_update]
+
     with SessionLocal() as session:
         max_id = session.query(func.max(Order.id)).scalar() or 0
         new_id = max_id + 1
 
-        orders = session.query(Order).order_by(Order.id.desc()).all()
-        results = order_to_dict(orders)
-
     if trigger_id == "page-content":
         # Only update the Row ID input field when the page is loaded
-        return [new_id, results, False, False] + clear_inputs
+        return [new_id] + unchanged + [False, False] + clear_inputs
 
     elif trigger_id == "add-button" and n_clicks > 0:
         with SessionLocal() as session:
@@ -552,7 +684,7 @@ def update_table_and_row_id(
             existing = session.query(Order).filter(Order.order_id == order_id).first()
 
             if not all(values):
-                return [new_id, results, False, True] + values
+                return [new_id] + unchanged + [False, True] + values
 
             if not existing:
                 new_row = Order(
@@ -583,15 +715,33 @@ def update_table_and_row_id(
                 )
 
                 session.add(new_row)
+                session.flush()
+                refresh_daily_rollup(session, [new_row.order_date])
+                sync_search_index(session, [new_id])
+                version = bump_data_version(session)
                 session.commit()
+                update_overview_metrics(new_row, version)
+
+                filters = get_table_filters(
+                    country_v, state_v, city_v, category_v, sub_category_v
+                )
+                if not order_matches(session, new_id, filters, filter_query, search):
+                    return [new_id + 1] + unchanged + [True, False] + clear_inputs
+
+                # The new row has the highest id, so it heads the default sort,
+                # search results are ranked instead
+                data = no_update
+                if not page_current and not sort_by and not search:
+                    data = Patch()
+                    data.prepend(order_to_dict([new_row])[0])
+                    del data[table_page_size]
 
-                # Refresh the data
-                orders = session.query(Order).order_by(Order.id.desc()).all()
-                results = order_to_dict(orders)
+                total = (total or 0) + 1
+                page_count = get_page_count(total, table_page_size)
 
-                return [new_id + 1, results, True, False] + clear_inputs
+                return [new_id + 1, data, page_count, total, True, False] + clear_inputs
 
             else:
-                return [new_id, results, False, True] + values
+                return [new_id] + unchanged + [False, True] + values
 
     raise PreventUpdate
@@ -0,0 +1,51 @@
+import threading
+
+from flask import Flask, jsonify
+from loguru import logger
+
+from src.db.connection import ReadSessionLocal
+from src.db.crud import get_overview_metrics
+from src.db.dataset import orders_dataset
+from src.db.hierarchy import hierarchy_index
+
+# Set once the caches below are loaded, reported by /ready
+caches_warm = threading.Event()
+
+
+def warm_caches():
+    """
+    Load the overview metrics, dropdown hierarchy and graph dataset so the
+    first requests don't pay for them
+    """
+    logger.info("Warming caches...")
+    with ReadSessionLocal() as session:
+        get_overview_metrics(session)
+        hierarchy_index.options(session, None, None, None)
+    orders_dataset.get()
+
+    caches_warm.set()
+    logger.info("Caches warm.")
+
+
+def warm_caches_in_background() -> threading.Thread:
+    """
+    Warm the caches without blocking the caller, /ready reports 503 until done
+    :return: The warm-up thread
+    """
+    thread = threading.Thread(target=warm_caches, name="warm-caches", daemon=True)
+    thread.start()
+
+    return thread
+
+
+def register_health_routes(server: Flask):
+    """
+    Add the readiness endpoint to the Flask server behind Dash
+    :param server: Flask server, app.server
+    """
+
+    @server.route("/ready")
+    def ready():
+        if caches_warm.is_set():
+            return jsonify(status="ready"), 200
+        return jsonify(status="warming"), 503
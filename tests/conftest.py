@@ -0,0 +1,38 @@
+import logging
+import os
+import tempfile
+
+import pytest
+from loguru import logger
+
+# Point the app at a throwaway database before src is imported
+test_dir = tempfile.mkdtemp(prefix="dash-example-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(test_dir, 'test.db')}"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ["STORAGE_LAYOUT"] = "wide"
+os.environ["DATASET_SNAPSHOT"] = ""
+os.environ["CALLBACK_CACHE"] = "memory"
+
+
+@pytest.fixture
+def caplog_loguru(caplog):
+    """
+    caplog that also captures loguru messages
+    """
+    handler_id = logger.add(caplog.handler, format="{message}", level="DEBUG")
+    caplog.set_level(logging.DEBUG)
+    yield caplog
+    logger.remove(handler_id)
+
+
+@pytest.fixture
+def database():
+    """
+    Empty the test database's tables and caches
+    :return: Engine for writes
+    """
+    from src.db.connection import engine
+    from tests.factories import reset_database
+
+    reset_database()
+    return engine
@@ -0,0 +1,69 @@
+import pandas as pd
+from sqlalchemy import delete
+
+from src.cache import callback_cache
+from src.db.connection import engine, init_db
+from src.db.dataset import orders_dataset
+from src.db.fixture import column_map, prepare_chunk, upsert_chunk, upsert_statement
+from src.db.model import Base
+from src.db.search import rebuild_search_index
+from src.db.version import ensure_database_id
+
+
+def reset_database():
+    """
+    Empty every table of the test database, as if it was recreated, and the
+    caches
+    """
+    init_db()
+    with engine.begin() as connection:
+        for table in reversed(Base.metadata.sorted_tables):
+            connection.execute(delete(table))
+        # Deleting from orders leaves its external content index behind
+        rebuild_search_index(connection)
+        ensure_database_id(connection)
+    callback_cache.clear()
+    orders_dataset.invalidate()
+
+
+def source_row(row_id: int, **values) -> dict:
+    """
+    One order as a row of a source file, with the source column names
+    :param row_id: Row ID
+    :param values: Order attributes to override, e.g. sales=1.5
+    :return: Dict of source column name to value
+    """
+    order = {
+        "id": row_id,
+        "order_id": f"ES-2021-{row_id or 0:07d}",
+        "order_date": "2021-03-01",
+        "dispatch_date": "2021-03-04",
+        "delivery_mode": "Standard Class",
+        "customer_id": "AB-10015",
+        "customer_name": "Aaron Bergman",
+        "segment": "Consumer",
+        "city": "London",
+        "state_province": "England",
+        "country_region": "United Kingdom",
+        "region": "North",
+        "product_id": "OFF-BI-10000001",
+        "category": "Office Supplies",
+        "sub_category": "Binders",
+        "product_name": "Wilson Jones Binder",
+        "sales": 10.5,
+        "quantity": 2,
+        "discount": 0.1,
+        "profit": 1.25,
+        **values,
+    }
+    return {source: order[column] for source, column in column_map.items()}
+
+
+def add_orders(database, *rows):
+    """
+    Upsert orders given as source rows, bumping the data version
+    :param database: Engine for writes
+    :param rows: Dicts from source_row
+    """
+    with database.begin() as connection:
+        upsert_chunk(connection, upsert_statement(), prepare_chunk(pd.DataFrame(rows)))
@@ -0,0 +1,102 @@
+import json
+
+import pytest
+from flask import Flask
+
+from src.api import register_api_routes
+from tests.factories import add_orders, source_row
+
+
+@pytest.fixture
+def client(database):
+    add_orders(
+        database,
+        *(source_row(row_id, sales=row_id * 100.0) for row_id in range(1, 6)),
+    )
+    server = Flask(__name__)
+    register_api_routes(server)
+
+    return server.test_client()
+
+
+def ids(response) -> list:
+    """
+    Order ids of a JSON page
+    :param response: Test client response
+    :return: List of ids
+    """
+    return [row[0] for row in response.json["data"]]
+
+
+def test_keyset_pages(client):
+    response = client.get("/api/orders?limit=2")
+    assert response.json["columns"][:2] == ["id", "order_id"]
+    assert ids(response) == [1, 2]
+    assert response.json["next"] == "/api/orders?after=2&limit=2"
+    assert response.headers["Link"] == '</api/orders?after=2&limit=2>; rel="next"'
+
+    response = client.get(response.json["next"])
+    assert ids(response) == [3, 4]
+
+    response = client.get(response.json["next"])
+    assert ids(response) == [5]
+    assert response.json["next"] is None
+    assert "Link" not in response.headers
+
+
+def test_filters_carry_over_to_the_next_page(client):
+    response = client.get("/api/orders?limit=1&filter_query={sales} s> 250")
+    assert ids(response) == [3]
+    response = client.get(response.json["next"])
+    assert ids(response) == [4]
+
+    response = client.get("/api/orders?start_date=2021-03-01&end_date=2021-03-01")
+    assert ids(response) == [1, 2, 3, 4, 5]
+    response = client.get("/api/orders?start_date=2021-03-02")
+    assert ids(response) == []
+
+
+def test_ndjson(client):
+    response = client.get("/api/orders?limit=2&format=ndjson")
+    assert response.mimetype == "application/x-ndjson"
+    records = [
+        json.loads(line) for line in response.get_data(as_text=True).splitlines()
+    ]
+    assert [record["id"] for record in records] == [1, 2]
+    assert records[0]["order_date"] == "2021-03-01"
+
+    response = client.get("/api/orders", headers={"Accept": "application/x-ndjson"})
+    assert response.mimetype == "application/x-ndjson"
+
+
+def test_not_modified(client):
+    response = client.get("/api/orders?limit=2")
+    etag = response.headers["ETag"]
+
+    response = client.get("/api/orders?limit=2", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    response = client.get("/api/orders?limit=3", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_etag_after_writes(client, database):
+    full_page = client.get("/api/orders?limit=2").headers["ETag"]
+    last_page = client.get("/api/orders?after=4&limit=2").headers["ETag"]
+
+    # An appended order can't change a full page, only the last one
+    add_orders(database, source_row(6))
+    assert client.get("/api/orders?limit=2").headers["ETag"] == full_page
+    assert client.get("/api/orders?after=4&limit=2").headers["ETag"] != last_page
+
+    # Updating an order may change any page
+    add_orders(database, source_row(1, sales=1.0))
+    assert client.get("/api/orders?limit=2").headers["ETag"] != full_page
+
+
+@pytest.mark.parametrize(
+    "query", ["after=x", "limit=x", "start_date=2021-13-01", "format=xml"]
+)
+def test_invalid_parameters(client, query):
+    assert client.get(f"/api/orders?{query}").status_code == 400
@@ -0,0 +1,81 @@
+from sqlalchemy import delete
+
+from src.cache import MemoryBackend, cache_key, memoize, missing
+from src.db.model import DatabaseIdentity, DataVersion
+from src.db.version import bump_data_version, ensure_database_id
+
+calls = []
+
+
+@memoize
+def count_calls(value, scale=1):
+    calls.append((value, scale))
+    return None if value is None else value * scale
+
+
+def test_cache_key():
+    key = cache_key(count_calls, (1,), {"scale": 2}, "a", 1)
+    assert key == cache_key(count_calls, (1,), {"scale": 2}, "a", 1)
+    assert key != cache_key(count_calls, (2,), {"scale": 2}, "a", 1)
+    assert key != cache_key(count_calls, (1,), {"scale": 3}, "a", 1)
+    assert key != cache_key(count_calls, (1,), {"scale": 2}, "b", 1)
+    assert key != cache_key(count_calls, (1,), {"scale": 2}, "a", 2)
+    assert key != cache_key(test_cache_key, (1,), {"scale": 2}, "a", 1)
+
+
+def test_memoize_caches_per_arguments(database):
+    calls.clear()
+    assert count_calls(2, scale=3) == 6
+    assert count_calls(2, scale=3) == 6
+    assert count_calls(2) == 2
+    assert calls == [(2, 3), (2, 1)]
+
+
+def test_memoize_caches_none(database):
+    calls.clear()
+    assert count_calls(None) is None
+    assert count_calls(None) is None
+    assert calls == [(None, 1)]
+
+
+def test_memoize_invalidated_by_data_version(database):
+    calls.clear()
+    count_calls(2)
+    with database.begin() as connection:
+        bump_data_version(connection)
+    count_calls(2)
+    count_calls(2)
+    assert calls == [(2, 1), (2, 1)]
+
+
+def test_memoize_not_shared_with_a_recreated_database(database):
+    calls.clear()
+    with database.begin() as connection:
+        bump_data_version(connection)
+    count_calls(2)
+
+    # Same URL and data version, another database, the cache is kept
+    with database.begin() as connection:
+        connection.execute(delete(DatabaseIdentity))
+        connection.execute(delete(DataVersion))
+        ensure_database_id(connection)
+        bump_data_version(connection)
+    count_calls(2)
+    assert calls == [(2, 1), (2, 1)]
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2, ttl=60)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+    assert backend.get("a") == 1
+    assert backend.get("b") is missing
+    assert backend.get("c") == 3
+
+
+def test_memory_backend_expires():
+    backend = MemoryBackend(max_entries=2, ttl=-1)
+    backend.set("a", 1)
+    assert backend.get("a") is missing
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+
+from src.db.connection import create_db_engine
+
+
+@pytest.mark.parametrize("url", ["sqlite://", "sqlite:///:memory:"])
+def test_in_memory_sqlite(url):
+    db_engine = create_db_engine(url)
+    with db_engine.connect() as connection:
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+
+
+def test_file_sqlite_pool(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    db_engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    assert isinstance(db_engine.pool, QueuePool)
+    assert db_engine.pool.size() == 3
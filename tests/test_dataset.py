@@ -0,0 +1,61 @@
+import pandas as pd
+
+from src.db.dataset import (
+    OrdersDataset,
+    read_snapshot,
+    snapshot_version,
+    write_snapshot,
+)
+from src.db.version import get_database_id
+from tests.factories import add_orders, reset_database, source_row
+
+
+def test_write_snapshot_keeps_newer_version(tmp_path):
+    path = str(tmp_path / "orders.arrow")
+    write_snapshot(pd.DataFrame({"sales": [1.0, 2.0]}), "a", 5, 2, path)
+
+    # An older reader finishing late must not replace the newer snapshot
+    write_snapshot(pd.DataFrame({"sales": [1.0]}), "a", 4, 1, path)
+    df, version, max_id = read_snapshot("a", path)
+    assert (version, max_id, len(df)) == (5, 2, 2)
+
+    write_snapshot(pd.DataFrame({"sales": [1.0, 2.0, 3.0]}), "a", 6, 3, path)
+    assert snapshot_version("a", path) == 6
+    assert list(tmp_path.iterdir()) == [tmp_path / "orders.arrow"]
+
+
+def test_snapshot_of_another_database(tmp_path):
+    path = str(tmp_path / "orders.arrow")
+    write_snapshot(pd.DataFrame({"sales": [1.0, 2.0]}), "a", 5, 2, path)
+
+    assert read_snapshot("b", path) is None
+    assert snapshot_version("b", path) is None
+    assert read_snapshot(None, path) is None
+
+    # Replaced whatever its version, the versions of another database don't count
+    write_snapshot(pd.DataFrame({"sales": [3.0]}), "b", 1, 1, path)
+    assert snapshot_version("a", path) is None
+    assert snapshot_version("b", path) == 1
+
+
+def test_snapshot_version_without_snapshot(tmp_path):
+    assert snapshot_version("a", str(tmp_path / "missing.arrow")) is None
+    assert read_snapshot("a", str(tmp_path / "missing.arrow")) is None
+
+
+def test_recreated_database_ignores_the_old_snapshot(database, tmp_path):
+    path = str(tmp_path / "orders.arrow")
+    add_orders(database, *(source_row(row_id, sales=1.0) for row_id in range(1, 4)))
+    OrdersDataset(path).save_snapshot()
+
+    # A new database at the same URL starts again at version 1
+    reset_database()
+    add_orders(database, *(source_row(row_id, sales=999.0) for row_id in range(1, 6)))
+
+    dataset = OrdersDataset(path)
+    assert dataset.get()["sales"].tolist() == [999.0] * 5
+
+    dataset.save_snapshot()
+    with database.connect() as connection:
+        df, version, max_id = read_snapshot(get_database_id(connection), path)
+    assert (len(df), version, max_id) == (5, 1, 5)
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+
+import pyarrow.parquet as pq
+import pytest
+from flask import Flask
+from openpyxl import load_workbook
+
+from src.export import export_url, register_export_routes
+from tests.factories import add_orders, source_row
+
+
+@pytest.fixture
+def client(database):
+    add_orders(
+        database,
+        source_row(1, sales=10.0),
+        source_row(2, sales=200.0),
+        source_row(3, sales=300.0, country_region="Germany", city="Berlin"),
+        source_row(4, sales=400.0, product_name="Eldon Shelf"),
+    )
+    server = Flask(__name__)
+    register_export_routes(server)
+
+    return server.test_client()
+
+
+def csv_ids(response) -> list:
+    """
+    Order ids of a CSV export
+    :param response: Test client response
+    :return: List of ids in file order
+    """
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    return [int(row["id"]) for row in rows]
+
+
+def test_export_url():
+    url = export_url(
+        "csv",
+        {"country_region": "Germany", "city": None},
+        [{"column_id": "sales", "direction": "asc"}],
+        "{sales} s> 100",
+        "binder",
+    )
+    assert url.startswith("/export/orders.csv?country_region=Germany&sort_by=")
+    assert "filter_query=%7Bsales%7D+s%3E+100" in url
+    assert url.endswith("&search=binder")
+    assert export_url("xlsx", {}) == "/export/orders.xlsx"
+
+
+def test_csv_applies_the_table_filters(client):
+    response = client.get(export_url("csv", {}))
+    assert response.mimetype == "text/csv"
+    assert "attachment" in response.headers["Content-Disposition"]
+    # Newest first, as on the table page
+    assert csv_ids(response) == [4, 3, 2, 1]
+
+    response = client.get(export_url("csv", {"country_region": "United Kingdom"}))
+    assert csv_ids(response) == [4, 2, 1]
+
+    response = client.get(export_url("csv", {}, filter_query="{sales} s> 100"))
+    assert csv_ids(response) == [4, 3, 2]
+
+    response = client.get(export_url("csv", {}, search="eldon"))
+    assert csv_ids(response) == [4]
+
+    sort_by = [{"column_id": "sales", "direction": "asc"}]
+    response = client.get(
+        export_url(
+            "csv", {"country_region": "United Kingdom"}, sort_by, "{sales} s>= 200"
+        )
+    )
+    assert csv_ids(response) == [2, 4]
+
+
+def test_parquet(client):
+    response = client.get(export_url("parquet", {}, filter_query="{sales} s< 250"))
+    table = pq.read_table(io.BytesIO(response.data))
+    assert table.column("id").to_pylist() == [2, 1]
+    assert table.column("sales").to_pylist() == [200.0, 10.0]
+
+
+def test_xlsx(client):
+    response = client.get(export_url("xlsx", {"city": "Berlin"}))
+    sheet = load_workbook(io.BytesIO(response.data)).worksheets[0]
+    rows = list(sheet.values)
+    assert rows[0][:2] == ("id", "order_id")
+    assert [row[0] for row in rows[1:]] == [3]
+
+
+def test_invalid_requests(client):
+    assert client.get("/export/orders.json").status_code == 404
+    assert client.get("/export/orders.csv?sort_by=nope").status_code == 400
+    sort_by = json.dumps({"column_id": "sales"})
+    assert client.get(f"/export/orders.csv?sort_by={sort_by}").status_code == 400
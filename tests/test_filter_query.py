@@ -0,0 +1,126 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.dialects import sqlite
+
+from src.db.connection import SessionLocal
+from src.db.crud import parse_filter_query
+from src.db.model import Order
+from tests.factories import add_orders, source_row
+
+
+def compiled(clauses: list) -> list:
+    """
+    Render filter clauses as SQL with their values inlined
+    :param clauses: SQLAlchemy filter clauses
+    :return: List of SQL strings
+    """
+    return [
+        str(
+            clause.compile(
+                dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        )
+        for clause in clauses
+    ]
+
+
+@pytest.mark.parametrize(
+    "filter_query, expected",
+    [
+        # What the DataTable sends for a number typed into a numeric column
+        ("{sales} s= 100", ["orders.sales = 100.0"]),
+        ("{sales} s> 100", ["orders.sales > 100.0"]),
+        ("{sales} s>= 100.5", ["orders.sales >= 100.5"]),
+        ("{sales} s< 100", ["orders.sales < 100.0"]),
+        ("{quantity} s<= 5", ["orders.quantity <= 5"]),
+        ("{quantity} s!= 5", ["orders.quantity != 5"]),
+        ("{city} i!= London", ["orders.city != 'London'"]),
+        ("{city} i= London", ["orders.city = 'London'"]),
+        ("{sales} > 100", ["orders.sales > 100.0"]),
+        ("{quantity} eq 3", ["orders.quantity = 3"]),
+        ("{quantity} ige 3", ["orders.quantity >= 3"]),
+        ("{quantity} s= 2.0", ["orders.quantity = 2"]),
+        # Fractions aren't truncated on integer columns
+        ("{quantity} s< 2.5", ["orders.quantity < 2.5"]),
+        ("{quantity} s= 2.5", ["orders.quantity = 2.5"]),
+        ("{id} s>= 1.5", ["orders.id >= 1.5"]),
+    ],
+)
+def test_relational_operators(filter_query, expected):
+    assert compiled(parse_filter_query(filter_query)) == expected
+
+
+@pytest.mark.parametrize(
+    "filter_query",
+    ["{city} contains Lon", "{city} scontains Lon", "{city} icontains Lon"],
+)
+def test_contains(filter_query):
+    (clause,) = compiled(parse_filter_query(filter_query))
+    assert "LIKE '%' || 'Lon' || '%'" in clause
+
+
+def test_quoted_value():
+    (clause,) = compiled(parse_filter_query('{city} icontains "New York"'))
+    assert "'New York'" in clause
+
+
+def test_datestartswith():
+    (clause,) = compiled(parse_filter_query("{order_date} datestartswith 2021-03"))
+    assert "LIKE '2021-03' || '%'" in clause
+
+
+def test_date_comparison():
+    (clause,) = parse_filter_query("{order_date} s>= 2021-03-01")
+    assert clause.right.value == date(2021, 3, 1)
+
+
+def test_combined_clauses():
+    clauses = parse_filter_query(
+        "{sales} s> 100 && {city} icontains Lon && {quantity} s<= 5"
+    )
+    assert len(clauses) == 3
+    assert compiled([clauses[0], clauses[2]]) == [
+        "orders.sales > 100.0",
+        "orders.quantity <= 5",
+    ]
+
+
+@pytest.mark.parametrize("filter_query", [None, ""])
+def test_empty(filter_query):
+    assert parse_filter_query(filter_query) == []
+
+
+@pytest.mark.parametrize(
+    "filter_query",
+    [
+        "{unknown} s= 1",
+        "{sales} s> abc",
+        "{order_date} s= yesterday",
+        "{sales} is blank",
+        "sales > 100",
+    ],
+)
+def test_unparsable_clause_is_logged(filter_query, caplog_loguru):
+    assert parse_filter_query(filter_query) == []
+    assert filter_query in caplog_loguru.text
+
+
+def test_unparsable_clause_keeps_the_others(caplog_loguru):
+    clauses = parse_filter_query("{sales} s> 100 && {unknown} s= 1")
+    assert compiled(clauses) == ["orders.sales > 100.0"]
+    assert "{unknown} s= 1" in caplog_loguru.text
+
+
+def test_fractional_integer_filters_match(database):
+    add_orders(database, source_row(1, quantity=1), source_row(2, quantity=2))
+
+    with SessionLocal() as session:
+        for filter_query, expected in [
+            ("{quantity} s< 2.5", [1, 2]),
+            ("{quantity} s= 2.5", []),
+            ("{quantity} s> 1.5", [2]),
+            ("{id} s>= 1.5", [2]),
+        ]:
+            query = session.query(Order.id).filter(*parse_filter_query(filter_query))
+            assert [row_id for (row_id,) in query.order_by(Order.id)] == expected
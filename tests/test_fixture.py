@@ -0,0 +1,108 @@
+import os
+from datetime import date
+
+import pandas as pd
+from sqlalchemy import func, select
+
+from src.db.fixture import (
+    load_data_to_db,
+    prepare_chunk,
+    upsert_chunk,
+    upsert_statement,
+)
+from src.db.model import Order
+from src.db.version import get_data_version
+from tests.factories import source_row
+
+
+def test_prepare_chunk_types():
+    (record,) = prepare_chunk(pd.DataFrame([source_row(1)]))
+    assert record["id"] == 1 and type(record["id"]) is int
+    assert record["quantity"] == 2 and type(record["quantity"]) is int
+    assert record["order_date"] == date(2021, 3, 1)
+    assert record["sales"] == 10.5
+
+
+def test_prepare_chunk_skips_bad_rows(caplog_loguru):
+    df = pd.DataFrame(
+        [
+            source_row(1),
+            source_row(2, sales="abc"),
+            source_row(3, order_date="not a date"),
+            source_row(4, quantity=2.5),
+            source_row(None),
+            source_row(6, sales=None, city=None),
+            source_row(7, order_date="03/02/2021"),
+        ]
+    )
+    records = prepare_chunk(df)
+
+    assert [record["id"] for record in records] == [1, 6, 7]
+    assert records[1]["sales"] is None and records[1]["city"] is None
+    assert records[2]["order_date"] == date(2021, 3, 2)
+    assert "Error validating row 2: invalid sales" in caplog_loguru.text
+    assert "Error validating row 3: invalid order_date" in caplog_loguru.text
+    assert "Error validating row 4: invalid quantity" in caplog_loguru.text
+
+
+def test_prepare_chunk_matches_validation():
+    df = pd.DataFrame([source_row(1), source_row(2, sales="abc")])
+    assert prepare_chunk(df, validate=True) == prepare_chunk(df)
+
+
+def test_upsert_chunk_writes_only_changes(database):
+    stmt = upsert_statement()
+    records = prepare_chunk(pd.DataFrame([source_row(1), source_row(2)]))
+
+    with database.begin() as connection:
+        assert upsert_chunk(connection, stmt, records) == 2
+        assert get_data_version(connection) == (1, 1)
+
+    # Unchanged rows write nothing and keep the version
+    with database.begin() as connection:
+        assert upsert_chunk(connection, stmt, records) == 0
+        assert get_data_version(connection) == (1, 1)
+
+    # New rows past the highest id are an append, the base version stays
+    records = prepare_chunk(pd.DataFrame([source_row(2), source_row(3)]))
+    with database.begin() as connection:
+        assert upsert_chunk(connection, stmt, records) == 1
+        assert get_data_version(connection) == (2, 1)
+
+    # A changed row moves the base version
+    records = prepare_chunk(pd.DataFrame([source_row(1, sales=99.0)]))
+    with database.begin() as connection:
+        assert upsert_chunk(connection, stmt, records) == 1
+        assert get_data_version(connection) == (3, 3)
+        assert (
+            connection.execute(select(Order.sales).where(Order.id == 1)).scalar()
+            == 99.0
+        )
+
+
+def test_load_data_to_db_skips_ingested_file(database, tmp_path, caplog_loguru):
+    source = tmp_path / "orders.csv"
+    pd.DataFrame([source_row(row_id) for row_id in range(1, 6)]).to_csv(
+        source, index=False
+    )
+
+    load_data_to_db(str(source), chunk_size=2)
+    with database.connect() as connection:
+        assert connection.execute(select(func.count(Order.id))).scalar() == 5
+        version = get_data_version(connection)
+
+    # The high-water mark says the unchanged file is complete
+    load_data_to_db(str(source), chunk_size=2)
+    assert f"Skipping {source}, unchanged since last ingest" in caplog_loguru.text
+    with database.connect() as connection:
+        assert get_data_version(connection) == version
+
+    # A changed file is read again, only its new row is written
+    pd.DataFrame([source_row(row_id) for row_id in range(1, 7)]).to_csv(
+        source, index=False
+    )
+    os.utime(source, (0, 0))
+    load_data_to_db(str(source), chunk_size=2)
+    assert "6 rows read, 1 new or changed" in caplog_loguru.text
+    with database.connect() as connection:
+        assert connection.execute(select(func.count(Order.id))).scalar() == 6
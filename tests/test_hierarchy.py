@@ -0,0 +1,39 @@
+from src.db.connection import SessionLocal
+from src.db.hierarchy import HierarchyIndex
+from tests.factories import add_orders, source_row
+
+
+def test_options_follow_the_selection(database):
+    add_orders(
+        database,
+        source_row(1),
+        source_row(
+            2, city="Paris", state_province="Ile-de-France", country_region="France"
+        ),
+        source_row(3, sub_category="Paper"),
+    )
+    index = HierarchyIndex()
+
+    with SessionLocal() as session:
+        countries, states, cities, categories, sub_categories = index.options(
+            session, "France", "Ile-de-France", "Office Supplies"
+        )
+        assert [option["value"] for option in countries] == ["France", "United Kingdom"]
+        assert states == [{"label": "Ile-de-France", "value": "Ile-de-France"}]
+        assert cities == [{"label": "Paris", "value": "Paris"}]
+        assert [option["value"] for option in sub_categories] == ["Binders", "Paper"]
+
+        assert index.options(session, None, None, None)[1:3] == ([], [])
+
+
+def test_rebuilt_when_the_data_version_changes(database):
+    add_orders(database, source_row(1))
+    index = HierarchyIndex()
+
+    with SessionLocal() as session:
+        assert len(index.options(session, None, None, None)[0]) == 1
+
+    add_orders(database, source_row(2, country_region="Germany"))
+    with SessionLocal() as session:
+        countries = index.options(session, None, None, None)[0]
+    assert [option["value"] for option in countries] == ["Germany", "United Kingdom"]
@@ -0,0 +1,50 @@
+import pytest
+from dash import Dash, Input, Output, html
+
+from src.metrics import callback_duration, register_metrics, sql_stats
+
+
+def duration_count(name: str) -> float:
+    """
+    Number of callback_duration observations of a callback
+    :param name: Callback function name
+    :return: Sample count
+    """
+    for metric in callback_duration.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_count") and sample.labels["callback"] == name:
+                return sample.value
+    return 0
+
+
+@pytest.fixture
+def client():
+    app = Dash(__name__)
+    app.layout = html.Div([html.Button(id="button"), html.Div(id="output")])
+
+    @app.callback(Output("output", "children"), Input("button", "n_clicks"))
+    def failing_callback(n_clicks):
+        raise ValueError("callback failed")
+
+    register_metrics(app)
+    # As in debug mode, the error reaches the WSGI server without a 500 response
+    app.server.config["PROPAGATE_EXCEPTIONS"] = True
+
+    return app.server.test_client()
+
+
+def test_failing_callback_is_recorded_and_reset(client):
+    before = duration_count("failing_callback")
+    with pytest.raises(ValueError):
+        client.post(
+            "/_dash-update-component",
+            json={
+                "output": "output.children",
+                "outputs": {"id": "output", "property": "children"},
+                "inputs": [{"id": "button", "property": "n_clicks", "value": 1}],
+                "changedPropIds": ["button.n_clicks"],
+            },
+        )
+
+    assert duration_count("failing_callback") == before + 1
+    assert sql_stats.get() is None
@@ -0,0 +1,27 @@
+from datetime import date
+
+from sqlalchemy import create_engine, literal, select
+from sqlalchemy.dialects import mysql, postgresql
+
+from src.db.model import Order
+from src.db.rollup import days_between
+
+
+def test_days_between_sqlite():
+    stmt = select(days_between(literal(date(2021, 2, 27)), literal(date(2021, 3, 2))))
+    with create_engine("sqlite://").connect() as connection:
+        assert connection.execute(stmt).scalar() == 3
+
+
+def test_days_between_postgresql():
+    expression = days_between(Order.order_date, Order.dispatch_date)
+    assert str(expression.compile(dialect=postgresql.dialect())) == (
+        "(orders.dispatch_date - orders.order_date)"
+    )
+
+
+def test_days_between_mysql():
+    expression = days_between(Order.order_date, Order.dispatch_date)
+    assert str(expression.compile(dialect=mysql.dialect())) == (
+        "DATEDIFF(orders.dispatch_date, orders.order_date)"
+    )
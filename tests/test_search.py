@@ -0,0 +1,92 @@
+import pytest
+from sqlalchemy import insert
+
+from src.db.connection import SessionLocal
+from src.db.model import Order
+from src.db.search import (
+    match_expression,
+    orders_fts,
+    search_orders,
+    search_rank,
+    sync_search_index,
+)
+from tests.factories import add_orders, source_row
+
+
+def search_ids(search: str) -> list:
+    """
+    Ids of the orders matching a search, best match first
+    :param search: Text typed by the user
+    :return: List of ids
+    """
+    with SessionLocal() as session:
+        query = search_orders(session.query(Order.id), search)
+        order_by = search_rank(query, search) + [Order.id]
+        return [row_id for (row_id,) in query.order_by(*order_by)]
+
+
+def check_index(database):
+    """
+    Fail if the search index doesn't match the orders table
+    :param database: Engine for writes
+    """
+    with database.begin() as connection:
+        connection.execute(
+            insert(orders_fts).values(orders_fts="integrity-check", rank=1)
+        )
+
+
+@pytest.mark.parametrize(
+    "search, expected",
+    [
+        ("wils bind", '"wils"* "bind"*'),
+        ("  Wilson  ", '"Wilson"*'),
+        ('"binder" OR 1=1 -x*', '"binder"* "OR"* "1"* "1"* "x"*'),
+        ("Zürich", '"Zürich"*'),
+        ("", None),
+        (None, None),
+        ("!?", None),
+    ],
+)
+def test_match_expression(search, expected):
+    assert match_expression(search) == expected
+
+
+def test_search_prefixes_across_columns(database):
+    add_orders(
+        database,
+        source_row(1, product_name="Wilson Jones Binder", city="London"),
+        source_row(2, product_name="Eldon Shelf", customer_name="Jones Smith"),
+        source_row(3, product_name="Avery Binder", city="Zürich"),
+    )
+
+    # The shorter name is the better match
+    assert search_ids("bind") == [3, 1]
+    assert search_ids("wils bind") == [1]
+    assert sorted(search_ids("jones")) == [1, 2]
+    assert search_ids("zurich") == [3]
+    assert search_ids("nothing") == []
+    assert len(search_ids("")) == 3
+
+
+def test_sync_search_index_on_update(database):
+    add_orders(database, source_row(1, product_name="Wilson Jones Binder"))
+    add_orders(database, source_row(1, product_name="Eldon Shelf"))
+    add_orders(database, source_row(2, product_name="Avery Binder"))
+
+    assert search_ids("wilson") == []
+    assert search_ids("eldon") == [1]
+    assert search_ids("binder") == [2]
+    check_index(database)
+
+
+def test_sync_search_index_on_insert(database):
+    # As the table page's add record does
+    with SessionLocal() as session:
+        session.add(Order(id=1, product_name="Fellowes Shredder", city="Leeds"))
+        session.flush()
+        sync_search_index(session, [1])
+        session.commit()
+
+    assert search_ids("shred leeds") == [1]
+    check_index(database)
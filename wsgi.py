@@ -0,0 +1,20 @@
+import os
+
+from app import app
+
+# WSGI callable for gunicorn/waitress, see gunicorn.conf.py
+server = app.server
+
+
+if __name__ == "__main__":
+    from waitress import serve
+
+    from src.server import warm_caches_in_background
+
+    # Waitress runs a single process, so warm the caches in this one
+    warm_caches_in_background()
+    serve(
+        server,
+        listen=os.environ.get("BIND", "0.0.0.0:8000"),
+        threads=int(os.environ.get("THREADS", 8)),
+    )